@@ -0,0 +1,26 @@
+"""
+Gunicorn settings for the AICP API (``gunicorn -c gunicorn.conf.py wsgi:app``).
+
+preload_app builds the app (DB engines, LLM client, schema summary) once in
+the master; workers inherit it copy-on-write instead of each initialising
+their own. Pooled DB connections and the log listener are recreated per
+worker by their at-fork hooks.
+
+Sessions live in each worker's memory unless REDIS_URL is set, so without
+Redis a single worker is the default and more are refused: a token issued
+by one worker would be unknown to the others.
+"""
+
+import os
+import sys
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '8000')}"
+preload_app = True
+workers = int(os.getenv("GUNICORN_WORKERS", "4" if os.getenv("REDIS_URL") else "1"))
+if workers > 1 and not os.getenv("REDIS_URL"):
+    print(f"ERROR: GUNICORN_WORKERS={workers} needs REDIS_URL for shared sessions.", file=sys.stderr)
+    sys.exit(1)
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+# /api/query may wait on the LLM for up to QUERY_ROUTE_TIMEOUT_SEC.
+timeout = int(os.getenv("QUERY_ROUTE_TIMEOUT_SEC", "120")) + 30
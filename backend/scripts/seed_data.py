@@ -1,8 +1,22 @@
+import os
+import pickle
 import random
-from datetime import datetime, timedelta
-
+import uuid
+import zlib
+from datetime import datetime
+from functools import partial
+from itertools import chain, islice
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+import numpy as np
 from faker import Faker
-from sqlalchemy import create_engine, MetaData, Table, select
+from sqlalchemy import create_engine, inspect, MetaData, Table, text
+
+try:
+    from numba import njit
+except ImportError:  # optional; the NumPy generator path is used instead
+    njit = None
 
 # --------------------------------------------------------------------
 # CONFIG
@@ -17,6 +31,28 @@ DB_URL = (
     "&TrustServerCertificate=yes"
 )
 
+# Rows per INSERT batch; keeps memory flat and stays well inside MSSQL's
+# 2100-parameter limit when the driver expands to multi-row VALUES.
+INSERT_BATCH_SIZE = 10000
+
+# Faker row generation is CPU-bound, so it runs on a process pool while the
+# main process keeps all DB I/O. Work is split into chunks of ids.
+NUM_WORKERS = 4
+GEN_CHUNK_SIZE = 1000
+
+# Child tables only depend on the already-committed parent ids, so they are
+# inserted concurrently, each on its own pooled connection.
+INSERT_WORKERS = 8
+
+# Standard bulk-load pattern: disable nonclustered indexes on the seeded
+# tables for the duration of the load and rebuild them once at the end.
+# Clustered, primary-key and unique indexes are left alone (a disabled
+# clustered index makes the table unreadable, and a disabled unique index
+# stops enforcing uniqueness during the load). DISABLE_CONSTRAINTS
+# additionally turns off FK/check constraints and re-validates them after.
+DISABLE_INDEXES = True
+DISABLE_CONSTRAINTS = False
+
 
 NUM_DOCTORS = 15
 NUM_PHARMACIES = 10
@@ -44,146 +80,450 @@ PER_PATIENT = {
 # --------------------------------------------------------------------
 # SETUP
 # --------------------------------------------------------------------
+# Every random stream derives from SEED, so a rerun reproduces the same data
+# regardless of worker count or the order chunks finish in.
+SEED = 42
+
 fake = Faker()
-random.seed(42)
-Faker.seed(42)
+random.seed(SEED)
+Faker.seed(SEED)
 
-engine = create_engine(DB_URL)
-metadata = MetaData()
+# worker pool for row generation; created in main()
+_pool = None
 
-# reflect the tables we care about (schema dbo)
-address_book_doctors = Table(
-    "address_book_doctors", metadata, schema="dbo", autoload_with=engine
-)
-pharmacies = Table(
-    "pharmacies", metadata, schema="dbo", autoload_with=engine
-)
-patients = Table(
-    "patients", metadata, schema="dbo", autoload_with=engine
-)
-referral_logs = Table(
-    "referral_logs", metadata, schema="dbo", autoload_with=engine
-)
-appointments = Table(
-    "appointments", metadata, schema="dbo", autoload_with=engine
-)
-patient_contacts = Table(
-    "patient_contacts", metadata, schema="dbo", autoload_with=engine
-)
-document_filled_out = Table(
-    "document_filled_out", metadata, schema="dbo", autoload_with=engine
-)
-patient_identity_verification = Table(
-    "patient_identity_verification", metadata, schema="dbo", autoload_with=engine
-)
-patient_lesion_history = Table(
-    "patient_lesion_history", metadata, schema="dbo", autoload_with=engine
-)
-patient_notes = Table(
-    "patient_notes", metadata, schema="dbo", autoload_with=engine
-)
-promo_codes = Table(
-    "promo_codes", metadata, schema="dbo", autoload_with=engine
-)
-task_notes = Table(
-    "task_notes", metadata, schema="dbo", autoload_with=engine
-)
-uploaded_documents = Table(
-    "uploaded_documents", metadata, schema="dbo", autoload_with=engine
-)
-walkin_cases = Table(
-    "walkin_cases", metadata, schema="dbo", autoload_with=engine
-)
-patient_last_measurement = Table(
-    "patient_last_measurement", metadata, schema="dbo", autoload_with=engine
-)
-bills = Table(
-    "bills", metadata, schema="dbo", autoload_with=engine
-)
-patient_history = Table(
-    "patient_history", metadata, schema="dbo", autoload_with=engine
-)
-submissions = Table(
-    "submissions", metadata, schema="dbo", autoload_with=engine
-)
+# Faker provider dispatch dominates per-row cost, so common values are drawn
+# once into small pools and sampled with random.choice. Values that should be
+# unique-ish (card/tax numbers) still come straight from Faker.
+POOL_SIZE = 1000
 
-# --------------------------------------------------------------------
-# HELPERS
-# --------------------------------------------------------------------
-def random_bool(p_true=0.5):
-    return random.random() < p_true
 
+def _sample_pool(make, size=POOL_SIZE):
+    return [make() for _ in range(size)]
+
+
+FIRST_NAMES = _sample_pool(fake.first_name)
+LAST_NAMES = _sample_pool(fake.last_name)
+CITIES = _sample_pool(fake.city)
+STREET_ADDRESSES = _sample_pool(fake.street_address)
+POSTAL_CODES = _sample_pool(fake.postalcode)
+PHONE_NUMBERS = _sample_pool(fake.phone_number)
+EMAILS = _sample_pool(fake.email)
+COMPANIES = _sample_pool(fake.company)
+TEXTS = {
+    n: _sample_pool(lambda: fake.text(max_nb_chars=n))
+    for n in (60, 80, 100, 120, 150, 200)
+}
+PARAGRAPHS = {n: _sample_pool(lambda: fake.paragraph(nb_sentences=n)) for n in (2, 3)}
+SENTENCES = {n: _sample_pool(lambda: fake.sentence(nb_words=n)) for n in (4, 6)}
+
+# Fixed JSON payload columns; one shared str per column instead of a literal
+# rebuilt into every row dict. If these ever vary per row, serialise with
+# orjson.dumps(...).decode() rather than json.dumps in the row loop.
+DOCUMENT_DATA_JSON = '{"field1":"value1","field2":"value2"}'
+QUESTIONNAIRE_JSON = '{"q1":"yes","q2":"no"}'
+CHANGE_DETAILS_JSON = '{"field":"value_before->value_after"}'
+
+# fast_executemany lets pyodbc bind the whole parameter array and ship it
+# in one batch instead of a round-trip per row.
+engine = create_engine(
+    DB_URL, fast_executemany=True, pool_size=INSERT_WORKERS, max_overflow=0
+)
+# Reflecting the tables costs a metadata round-trip per table, so the result
+# is reflected once (one batched reflect() call) and pickled next to this
+# script. Delete the file after a schema change to pick it up.
+SCHEMA_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".seed_schema.pkl")
+SEED_TABLE_NAMES = [
+    "address_book_doctors",
+    "pharmacies",
+    "patients",
+    "referral_logs",
+    "appointments",
+    "patient_contacts",
+    "document_filled_out",
+    "patient_identity_verification",
+    "patient_lesion_history",
+    "patient_notes",
+    "promo_codes",
+    "task_notes",
+    "uploaded_documents",
+    "walkin_cases",
+    "patient_last_measurement",
+    "bills",
+    "patient_history",
+    "submissions",
+]
 
-def random_datetime_within(days_back=365):
-    now = datetime.utcnow()
-    delta = timedelta(days=random.randint(0, days_back), seconds=random.randint(0, 86400))
-    return now - delta
 
+def load_metadata(schema="dbo"):
+    if os.path.exists(SCHEMA_CACHE):
+        with open(SCHEMA_CACHE, "rb") as f:
+            md = pickle.load(f)
+        if all(f"{schema}.{name}" in md.tables for name in SEED_TABLE_NAMES):
+            return md
+    md = MetaData()
+    md.reflect(bind=engine, schema=schema, only=SEED_TABLE_NAMES)
+    with open(SCHEMA_CACHE, "wb") as f:
+        pickle.dump(md, f)
+    return md
+
+
+metadata = load_metadata()
+address_book_doctors = metadata.tables["dbo.address_book_doctors"]
+pharmacies = metadata.tables["dbo.pharmacies"]
+patients = metadata.tables["dbo.patients"]
+referral_logs = metadata.tables["dbo.referral_logs"]
+appointments = metadata.tables["dbo.appointments"]
+patient_contacts = metadata.tables["dbo.patient_contacts"]
+document_filled_out = metadata.tables["dbo.document_filled_out"]
+patient_identity_verification = metadata.tables["dbo.patient_identity_verification"]
+patient_lesion_history = metadata.tables["dbo.patient_lesion_history"]
+patient_notes = metadata.tables["dbo.patient_notes"]
+promo_codes = metadata.tables["dbo.promo_codes"]
+task_notes = metadata.tables["dbo.task_notes"]
+uploaded_documents = metadata.tables["dbo.uploaded_documents"]
+walkin_cases = metadata.tables["dbo.walkin_cases"]
+patient_last_measurement = metadata.tables["dbo.patient_last_measurement"]
+bills = metadata.tables["dbo.bills"]
+patient_history = metadata.tables["dbo.patient_history"]
+submissions = metadata.tables["dbo.submissions"]
+
+SEED_TABLES = [metadata.tables[f"dbo.{name}"] for name in SEED_TABLE_NAMES]
 
-def per_patient_count(table_name):
-    lo, hi = PER_PATIENT.get(table_name, (0, 0))
-    if hi <= 0:
-        return 0
-    return random.randint(lo, hi)
+# --------------------------------------------------------------------
+# HELPERS
+# --------------------------------------------------------------------
+def rng_bools(rng, n, p_true=0.5):
+    return (rng.random(n) < p_true).tolist()
+
+
+def rng_ints(rng, lo, hi, n):
+    """n uniform ints in [lo, hi], like random.randint."""
+    return rng.integers(lo, hi + 1, n).tolist()
+
+
+def rng_uniform(rng, lo, hi, n, decimals):
+    return np.round(rng.uniform(lo, hi, n), decimals).tolist()
+
+
+def rng_choices(rng, options, n):
+    return np.array(options, dtype=object)[rng.integers(0, len(options), n)].tolist()
+
+
+def rng_fks(rng, ids, n, p_present=1.0):
+    """n foreign-key picks from ids, None with probability 1 - p_present (or if ids is empty)."""
+    if not ids:
+        return [None] * n
+    picks = np.asarray(ids, dtype=object)[rng.integers(0, len(ids), n)]
+    if p_present < 1.0:
+        picks[rng.random(n) >= p_present] = None
+    return picks.tolist()
+
+
+def rng_datetime64(rng, n, days_back=365):
+    """n datetime64[us] timestamps spread over the last days_back days."""
+    now = np.datetime64(datetime.utcnow(), "us")
+    offsets = rng.integers(0, (days_back + 1) * 86400, n).astype("timedelta64[s]")
+    return now - offsets
+
+
+def rng_datetimes(rng, n, days_back=365):
+    """n timestamps spread over the last days_back days, as datetime objects."""
+    return rng_datetime64(rng, n, days_back).tolist()
+
+
+def rng_dates64(rng, n, days_back, days_min=0):
+    """n datetime64[D] dates between days_back and days_min days ago."""
+    today = np.datetime64(datetime.utcnow().date(), "D")
+    return today - rng.integers(days_min, days_back + 1, n).astype("timedelta64[D]")
+
+
+def add_years64(dates, years):
+    """datetime64[D] + whole years, clamping Feb 29 to Feb 28 like a calendar would."""
+    months = dates.astype("datetime64[M]")
+    shifted = (months + 12 * years).astype("datetime64[D]") + (dates - months.astype("datetime64[D]"))
+    month_end = (months + 12 * years + 1).astype("datetime64[D]") - np.timedelta64(1, "D")
+    return np.minimum(shifted, month_end)
+
+
+def rng_uuids(rng, n):
+    """n random version-4 UUID strings from one rng.bytes draw."""
+    raw = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+    h = raw.tobytes().hex()
+    return [
+        f"{h[j:j + 8]}-{h[j + 8:j + 12]}-{h[j + 12:j + 16]}-{h[j + 16:j + 20]}-{h[j + 20:j + 32]}"
+        for j in range(0, 32 * n, 32)
+    ]
+
+
+# Numeric-only columns for the widest child tables. With numba installed the
+# draws run in one compiled loop per chunk (seeded from the chunk's rng so
+# output stays reproducible); strings and datetimes are still filled in
+# Python, since numba can't produce them.
+if njit is not None:
+    @njit(cache=True)
+    def _lesion_kernel(seed, n):
+        np.random.seed(seed)
+        xs = np.empty(n, np.int64)
+        ys = np.empty(n, np.int64)
+        urgency = np.empty(n, np.int64)
+        facing = np.empty(n, np.bool_)
+        ai_correct = np.empty(n, np.bool_)
+        accepted = np.empty(n, np.bool_)
+        for i in range(n):
+            xs[i] = np.random.randint(0, 1001)
+            ys[i] = np.random.randint(0, 1001)
+            urgency[i] = np.random.randint(1, 6)
+            facing[i] = np.random.random() < 0.5
+            ai_correct[i] = np.random.random() < 0.8
+            accepted[i] = np.random.random() < 0.9
+        return xs, ys, urgency, facing, ai_correct, accepted
+
+    @njit(cache=True)
+    def _measurement_kernel(seed, n):
+        np.random.seed(seed)
+        height = np.empty(n, np.float64)
+        weight = np.empty(n, np.float64)
+        systolic = np.empty(n, np.int64)
+        diastolic = np.empty(n, np.int64)
+        pulse = np.empty(n, np.int64)
+        for i in range(n):
+            height[i] = np.random.uniform(150.0, 195.0)
+            weight[i] = np.random.uniform(50.0, 110.0)
+            systolic[i] = np.random.randint(100, 151)
+            diastolic[i] = np.random.randint(60, 96)
+            pulse[i] = np.random.randint(55, 111)
+        return height, weight, systolic, diastolic, pulse
+
+    @njit(cache=True)
+    def _bill_kernel(seed, n):
+        np.random.seed(seed)
+        amount = np.empty(n, np.float64)
+        is_paid = np.empty(n, np.bool_)
+        days_to_pay = np.empty(n, np.int64)
+        for i in range(n):
+            amount[i] = np.random.uniform(50.0, 400.0)
+            is_paid[i] = np.random.random() < 0.7
+            days_to_pay[i] = np.random.randint(0, 61)
+        return amount, is_paid, days_to_pay
+
+
+def _kernel_seed(rng):
+    return int(rng.integers(0, 2**32))
+
+
+def lesion_numeric(rng, n):
+    """(xs, ys, urgency, facing_forward, ai_correct, accepted) as lists."""
+    if njit is not None:
+        return tuple(a.tolist() for a in _lesion_kernel(_kernel_seed(rng), n))
+    return (
+        rng_ints(rng, 0, 1000, n),
+        rng_ints(rng, 0, 1000, n),
+        rng_ints(rng, 1, 5, n),
+        rng_bools(rng, n, 0.5),
+        rng_bools(rng, n, 0.8),
+        rng_bools(rng, n, 0.9),
+    )
+
+
+def measurement_numeric(rng, n):
+    """(height, weight, systolic, diastolic, pulse) as lists."""
+    if njit is not None:
+        height, weight, systolic, diastolic, pulse = _measurement_kernel(_kernel_seed(rng), n)
+        return (
+            np.round(height, 1).tolist(),
+            np.round(weight, 1).tolist(),
+            systolic.tolist(),
+            diastolic.tolist(),
+            pulse.tolist(),
+        )
+    return (
+        rng_uniform(rng, 150, 195, n, 1),
+        rng_uniform(rng, 50, 110, n, 1),
+        rng_ints(rng, 100, 150, n),
+        rng_ints(rng, 60, 95, n),
+        rng_ints(rng, 55, 110, n),
+    )
+
+
+def bill_numeric(rng, n):
+    """(amount, is_paid, days_to_pay) as lists."""
+    if njit is not None:
+        amount, is_paid, days_to_pay = _bill_kernel(_kernel_seed(rng), n)
+        return np.round(amount, 2).tolist(), is_paid.tolist(), days_to_pay.tolist()
+    return (
+        rng_uniform(rng, 50, 400, n, 2),
+        rng_bools(rng, n, 0.7),
+        rng_ints(rng, 0, 60, n),
+    )
+
+
+def batched(rows, size):
+    """Yield lists of up to size rows from any iterable (itertools.batched is 3.12+)."""
+    it = iter(rows)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def bulk_insert(conn, table, rows, batch=INSERT_BATCH_SIZE):
+    """Insert rows (any iterable) one batch at a time; returns the row count."""
+    count = 0
+    for chunk in batched(rows, batch):
+        conn.execute(table.insert(), chunk)
+        count += len(chunk)
+    return count
+
+
+def bulk_insert_returning_ids(conn, table, rows, batch=INSERT_BATCH_SIZE):
+    """Insert rows and return the generated ids of just those rows."""
+    ids = []
+    stmt = table.insert().returning(table.c.id)
+    for chunk in batched(rows, batch):
+        ids.extend(conn.execute(stmt, chunk).scalars().all())
+    return ids
+
+
+def disable_indexes(conn, tables):
+    """Disable the enabled, non-unique nonclustered indexes; returns what was disabled."""
+    disabled = []
+    for table in tables:
+        names = conn.execute(
+            text(
+                "SELECT i.name FROM sys.indexes i "
+                "JOIN sys.tables t ON t.object_id = i.object_id "
+                "JOIN sys.schemas s ON s.schema_id = t.schema_id "
+                "WHERE s.name = :schema AND t.name = :table "
+                "AND i.type_desc = 'NONCLUSTERED' AND i.is_disabled = 0 "
+                "AND i.is_primary_key = 0 AND i.is_unique_constraint = 0 AND i.is_unique = 0"
+            ),
+            {"schema": table.schema, "table": table.name},
+        ).scalars().all()
+        for name in names:
+            conn.exec_driver_sql(f"ALTER INDEX [{name}] ON [{table.schema}].[{table.name}] DISABLE")
+            disabled.append((table, name))
+    return disabled
+
+
+def rebuild_indexes(conn, disabled):
+    for table, name in disabled:
+        conn.exec_driver_sql(f"ALTER INDEX [{name}] ON [{table.schema}].[{table.name}] REBUILD")
+
+
+def set_constraints(conn, tables, enabled):
+    # WITH CHECK re-validates existing rows so the constraints stay trusted
+    # by the optimizer after being switched back on.
+    sql = "WITH CHECK CHECK CONSTRAINT ALL" if enabled else "NOCHECK CONSTRAINT ALL"
+    for table in tables:
+        conn.exec_driver_sql(f"ALTER TABLE [{table.schema}].[{table.name}] {sql}")
+
+
+def stream_seed(name):
+    """Independent, reproducible SeedSequence for one named stream (a builder, a draw)."""
+    return np.random.SeedSequence([SEED, zlib.crc32(name.encode())])
+
+
+def _build_chunk(builder, kwargs, task):
+    # Seed every generator the builder might touch from the chunk's own
+    # SeedSequence, so the output doesn't depend on which worker runs it.
+    chunk, seq = task
+    seed = int(seq.generate_state(1)[0])
+    random.seed(seed)
+    fake.seed_instance(seed)
+    return builder(chunk, np.random.default_rng(seq), **kwargs)
+
+
+def generate_rows(builder, items, **kwargs):
+    """Lazily yield rows from builder(chunk, rng, **kwargs) over chunks of items.
+
+    Chunks are built on the pool if any; imap hands back each chunk as soon as
+    it is ready, so inserts overlap generation and only a few chunks are ever
+    held in memory. Chunk k of a builder always gets the k-th child of that
+    builder's stream_seed.
+    """
+    starts = range(0, len(items), GEN_CHUNK_SIZE)
+    seqs = stream_seed(builder.__name__).spawn(len(starts))
+    tasks = ((items[i:i + GEN_CHUNK_SIZE], seq) for i, seq in zip(starts, seqs))
+    fn = partial(_build_chunk, builder, kwargs)
+    results = _pool.imap(fn, tasks) if _pool is not None else map(fn, tasks)
+    return chain.from_iterable(results)
+
+
+def sample_child_counts(rng, n_patients, table_names):
+    """Rows per (patient, table) as one (n_patients, n_tables) draw from PER_PATIENT."""
+    bounds = np.array([PER_PATIENT.get(name, (0, 0)) for name in table_names]).reshape(-1, 2)
+    return rng.integers(bounds[:, 0], bounds[:, 1] + 1, size=(n_patients, len(table_names)))
 
 
 # --------------------------------------------------------------------
 # SEED FUNCTIONS
 # --------------------------------------------------------------------
-def seed_doctors(conn, n=NUM_DOCTORS):
+def build_doctors_rows(indices, rng):
+    n = len(indices)
+    status = rng_choices(rng, ["active", "inactive"], n)
     rows = []
-    for _ in range(n):
-        first = fake.first_name()
-        last = fake.last_name()
+    for i in range(n):
+        first = random.choice(FIRST_NAMES)
+        last = random.choice(LAST_NAMES)
         rows.append(
             {
                 "cpso_number": str(fake.random_int(100000, 999999)),
                 "first_name": first,
                 "last_name": last,
                 "clinic_name": f"{last} Dermatology Clinic",
-                "clinic_address": fake.street_address(),
+                "clinic_address": random.choice(STREET_ADDRESSES),
                 "clinic_address_2": None,
-                "city": fake.city(),
+                "city": random.choice(CITIES),
                 "province": "ON",
-                "postal": fake.postalcode(),
-                "phone": fake.phone_number(),
-                "fax": fake.phone_number(),
-                "email": fake.email(),
-                "status": random.choice(["active", "inactive"]),
-                "notes": fake.text(max_nb_chars=100),
+                "postal": random.choice(POSTAL_CODES),
+                "phone": random.choice(PHONE_NUMBERS),
+                "fax": random.choice(PHONE_NUMBERS),
+                "email": random.choice(EMAILS),
+                "status": status[i],
+                "notes": random.choice(TEXTS[100]),
                 "for_search": None,
                 "for_search_vector": None,
             }
         )
-    conn.execute(address_book_doctors.insert(), rows)
-    doctor_ids = conn.execute(select(address_book_doctors.c.id)).scalars().all()
+    return rows
+
+
+def seed_doctors(conn, n=NUM_DOCTORS):
+    rows = generate_rows(build_doctors_rows, list(range(n)))
+    doctor_ids = bulk_insert_returning_ids(conn, address_book_doctors, rows)
     return doctor_ids
 
 
+def build_pharmacies_rows(indices, rng):
+    n = len(indices)
+    status = rng_choices(rng, ["active", "inactive"], n)
+    return [
+        {
+            "name": f"{random.choice(COMPANIES)} Pharmacy",
+            "store_number": str(fake.random_int(100, 999)),
+            "street_address": random.choice(STREET_ADDRESSES),
+            "street_address_2": None,
+            "city": random.choice(CITIES),
+            "province": "ON",
+            "postal": random.choice(POSTAL_CODES),
+            "phone": random.choice(PHONE_NUMBERS),
+            "fax": random.choice(PHONE_NUMBERS),
+            "email": random.choice(EMAILS),
+            "status": status[i],
+            "notes": random.choice(TEXTS[100]),
+            "for_search": None,
+            "for_search_vector": None,
+        }
+        for i in range(n)
+    ]
+
+
 def seed_pharmacies(conn, n=NUM_PHARMACIES):
-    rows = []
-    for _ in range(n):
-        rows.append(
-            {
-                "name": f"{fake.company()} Pharmacy",
-                "store_number": str(fake.random_int(100, 999)),
-                "street_address": fake.street_address(),
-                "street_address_2": None,
-                "city": fake.city(),
-                "province": "ON",
-                "postal": fake.postalcode(),
-                "phone": fake.phone_number(),
-                "fax": fake.phone_number(),
-                "email": fake.email(),
-                "status": random.choice(["active", "inactive"]),
-                "notes": fake.text(max_nb_chars=100),
-                "for_search": None,
-                "for_search_vector": None,
-            }
-        )
-    conn.execute(pharmacies.insert(), rows)
-    pharmacy_ids = conn.execute(select(pharmacies.c.id)).scalars().all()
+    rows = generate_rows(build_pharmacies_rows, list(range(n)))
+    pharmacy_ids = bulk_insert_returning_ids(conn, pharmacies, rows)
     return pharmacy_ids
+
+
 # ------------------------------
 # Optional: App user / role table seeding (for RBAC demo)
 # We keep this flexible because your table name / columns may evolve.
@@ -272,60 +612,80 @@ def seed_app_users(conn, auth_table, doctor_ids, pharmacy_ids):
     # Insert (skip empty dict rows if a table has unexpected required cols)
     rows = [r for r in rows if r]
     if rows:
-        conn.execute(insert(auth_table), rows)
-
-
-def seed_patients(conn, doctor_ids, pharmacy_ids, n=NUM_PATIENTS):
+        bulk_insert(conn, auth_table, rows)
+
+
+def build_patients_rows(indices, rng, doctor_ids, pharmacy_ids):
+    n = len(indices)
+    sex = rng_choices(rng, ["male", "female", "other"], n)
+    insurer = rng_choices(rng, ["OHIP", "Private", "Uninsured"], n)
+    notification = rng_choices(rng, [None, "pending", "sent", "acknowledged"], n)
+    insurance = rng_choices(rng, ["valid", "expired", "pending", None], n)
+    delivery = rng_choices(rng, [None, "enabled", "disabled"], n)
+    contact_method = rng_choices(rng, [None, "phone", "email", "text"], n)
+    fam_drs = rng_fks(rng, doctor_ids, n, 0.7)
+    ref_drs = rng_fks(rng, doctor_ids, n, 0.4)
+    pharms = rng_fks(rng, pharmacy_ids, n, 0.7)
+    from_app = rng_bools(rng, n, 0.3)
+    privacy = rng_bools(rng, n, 0.95)
+    medical_consent = rng_bools(rng, n, 0.95)
+    archived = rng_bools(rng, n, 0.05)
+    is_contact = rng_bools(rng, n, 0.1)
+    card_valid = rng_bools(rng, n, 0.9)
+    diff_mailing = rng_bools(rng, n, 0.1)
+    keep_name = rng_bools(rng, n, 0.8)
+    con_call = rng_bools(rng, n, 0.7)
+    con_email = rng_bools(rng, n, 0.7)
+    con_text = rng_bools(rng, n, 0.7)
+    english_marketing = rng_bools(rng, n, 0.5)
+    research = rng_bools(rng, n, 0.3)
+    phil_marketing = rng_bools(rng, n, 0.3)
+    attempts = rng_ints(rng, 0, 3, n)
+
+    created_at = rng_datetimes(rng, n)
+    health_card_last_validated = rng_datetimes(rng, n)
+    births64 = rng_dates64(rng, n, days_back=95 * 365, days_min=18 * 365)
+    births = births64.tolist()
+    expiry = add_years64(births64, 70).tolist()
     rows = []
-    for _ in range(n):
-        first = fake.first_name()
-        last = fake.last_name()
-        birth = fake.date_of_birth(minimum_age=18, maximum_age=95)
-        fam_dr = random.choice(doctor_ids) if doctor_ids and random_bool(0.7) else None
-        ref_dr = random.choice(doctor_ids) if doctor_ids and random_bool(0.4) else None
-        pharm = random.choice(pharmacy_ids) if pharmacy_ids and random_bool(0.7) else None
-
+    for i in range(n):
+        first = random.choice(FIRST_NAMES)
+        last = random.choice(LAST_NAMES)
         rows.append(
             {
                 "first_name": first,
                 "last_name": last,
-                "birth": birth,
-                "sex": random.choice(["male", "female", "other"]),
-                "street_address": fake.street_address(),
+                "birth": births[i],
+                "sex": sex[i],
+                "street_address": random.choice(STREET_ADDRESSES),
                 "street_address_2": None,
-                "city": fake.city(),
+                "city": random.choice(CITIES),
                 "province": "ON",
-                "postal": fake.postalcode(),
+                "postal": random.choice(POSTAL_CODES),
                 "health_card_number": str(fake.random_int(1000000000, 9999999999)),
-                "health_card_expiry_date": birth.replace(year=birth.year + 70),
-                "home_phone": fake.phone_number(),
-                "cell_phone": fake.phone_number(),
-                "email": fake.email(),
-                "created_at": random_datetime_within(365),
+                "health_card_expiry_date": expiry[i],
+                "home_phone": random.choice(PHONE_NUMBERS),
+                "cell_phone": random.choice(PHONE_NUMBERS),
+                "email": random.choice(EMAILS),
+                "created_at": created_at[i],
                 "creator_id": None,
-                "family_dr_id": fam_dr,
-                "referring_dr_id": ref_dr,
+                "family_dr_id": fam_drs[i],
+                "referring_dr_id": ref_drs[i],
                 "global_message": None,
-                "from_app": random_bool(0.3),
-                "medical_history": fake.text(max_nb_chars=200),
-                "allergy_history": fake.text(max_nb_chars=100),
-                "medication_history": fake.text(max_nb_chars=150),
-                "pharmacy_id": pharm,
+                "from_app": from_app[i],
+                "medical_history": random.choice(TEXTS[200]),
+                "allergy_history": random.choice(TEXTS[100]),
+                "medication_history": random.choice(TEXTS[150]),
+                "pharmacy_id": pharms[i],
                 "app_uid": None,
-                "insurer": random.choice(["OHIP", "Private", "Uninsured"]),
+                "insurer": insurer[i],
                 "app_token": None,
-                "privacy_consent": random_bool(0.95),
-                "medical_data_consent": random_bool(0.95),
-                "family_practice_notification_status": random.choice(
-                    [None, "pending", "sent", "acknowledged"]
-                ),
-                "insurance_status": random.choice(
-                    ["valid", "expired", "pending", None]
-                ),
-                "pharmacy_delivery_status": random.choice(
-                    [None, "enabled", "disabled"]
-                ),
-                "archived": random_bool(0.05),
+                "privacy_consent": privacy[i],
+                "medical_data_consent": medical_consent[i],
+                "family_practice_notification_status": notification[i],
+                "insurance_status": insurance[i],
+                "pharmacy_delivery_status": delivery[i],
+                "archived": archived[i],
                 "ekg_larm_patient_id": None,
                 "ekg_larm_patient_hash": None,
                 "mailing_location_id": None,
@@ -333,23 +693,21 @@ def seed_patients(conn, doctor_ids, pharmacy_ids, n=NUM_PATIENTS):
                 "previous_specialist_id": None,
                 "previous_specialist_location_id": None,
                 "preferred_patient_contact_id": None,
-                "is_contact": random_bool(0.1),
-                "health_card_valid": random_bool(0.9),
-                "health_card_last_validated": random_datetime_within(365),
-                "has_different_mailing_address": random_bool(0.1),
-                "preferred_name": first if random_bool(0.8) else fake.first_name(),
-                "preferred_contact_method": random.choice(
-                    [None, "phone", "email", "text"]
-                ),
-                "con_call": random_bool(0.7),
-                "con_email": random_bool(0.7),
-                "con_text": random_bool(0.7),
-                "english_marketing_consent": random_bool(0.5),
-                "third_party_research_consent": random_bool(0.3),
+                "is_contact": is_contact[i],
+                "health_card_valid": card_valid[i],
+                "health_card_last_validated": health_card_last_validated[i],
+                "has_different_mailing_address": diff_mailing[i],
+                "preferred_name": first if keep_name[i] else random.choice(FIRST_NAMES),
+                "preferred_contact_method": contact_method[i],
+                "con_call": con_call[i],
+                "con_email": con_email[i],
+                "con_text": con_text[i],
+                "english_marketing_consent": english_marketing[i],
+                "third_party_research_consent": research[i],
                 "emr_uid": None,
                 "patient_uid": None,
-                "phil_marketing_consent": random_bool(0.3),
-                "sms_email_consent_verification_attempts": random.randint(0, 3),
+                "phil_marketing_consent": phil_marketing[i],
+                "sms_email_consent_verification_attempts": attempts[i],
                 "acu_id": None,
                 "mailing_address": None,
                 "for_search": None,
@@ -363,365 +721,435 @@ def seed_patients(conn, doctor_ids, pharmacy_ids, n=NUM_PATIENTS):
                 "medical_name": f"{last}, {first}",
             }
         )
+    return rows
 
-    conn.execute(patients.insert(), rows)
-    patient_ids = conn.execute(select(patients.c.id)).scalars().all()
+
+def seed_patients(conn, doctor_ids, pharmacy_ids, n=NUM_PATIENTS):
+    rows = generate_rows(
+        build_patients_rows, list(range(n)),
+        doctor_ids=doctor_ids, pharmacy_ids=pharmacy_ids,
+    )
+    patient_ids = bulk_insert_returning_ids(conn, patients, rows)
     return patient_ids
 
 
 # --------------------------------------------------------------------
 # CHILD TABLES (ALL REQUIRE patient_id)
 # --------------------------------------------------------------------
-def seed_referral_logs(conn, patient_ids, doctor_ids, pharmacy_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("referral_logs")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "referring_dr_id": random.choice(doctor_ids) if doctor_ids else None,
-                    "pharmacy_id": random.choice(pharmacy_ids) if pharmacy_ids else None,
-                    "created_at": random_datetime_within(365),
-                    "archived": random_bool(0.1),
-                    "notes": fake.text(max_nb_chars=120),
-                }
-            )
-    if rows:
-        conn.execute(referral_logs.insert(), rows)
-
-
-def seed_appointments(conn, patient_ids, doctor_ids, pharmacy_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("appointments")):
-            start = random_datetime_within(365)
-            end = start + timedelta(minutes=random.choice([15, 30, 45]))
-            rows.append(
-                {
-                    "appointment_uid": fake.uuid4(),
-                    "patient_id": pid,
-                    "doctor_id": random.choice(doctor_ids) if doctor_ids else None,
-                    "start_time": start,
-                    "end_time": end,
-                    "status": random.choice(["booked", "completed", "cancelled"]),
-                    "visit_type": random.choice(["initial", "follow-up", "walk-in"]),
-                    "created_at": start - timedelta(days=7),
-                    "created_by": None,
-                    "updated_at": end,
-                    "updated_by": None,
-                    "notes": fake.text(max_nb_chars=80),
-                    "pharmacy_id": random.choice(pharmacy_ids) if pharmacy_ids else None,
-                }
-            )
-    if rows:
-        conn.execute(appointments.insert(), rows)
-
-
-def seed_patient_contacts(conn, patient_ids):
+def build_referral_logs_rows(row_pids, rng, doctor_ids, pharmacy_ids):
+    n = len(row_pids)
+    archived = rng_bools(rng, n, 0.1)
+    created_at = rng_datetimes(rng, n)
+    ref_drs = rng_fks(rng, doctor_ids, n)
+    pharms = rng_fks(rng, pharmacy_ids, n)
+    return [
+        {
+            "patient_id": pid,
+            "referring_dr_id": ref_drs[i],
+            "pharmacy_id": pharms[i],
+            "created_at": created_at[i],
+            "archived": archived[i],
+            "notes": random.choice(TEXTS[120]),
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_appointments_rows(row_pids, rng, doctor_ids, pharmacy_ids):
+    n = len(row_pids)
+    minutes = np.array([15, 30, 45], dtype="timedelta64[m]")[rng.integers(0, 3, n)]
+    status = rng_choices(rng, ["booked", "completed", "cancelled"], n)
+    visit_type = rng_choices(rng, ["initial", "follow-up", "walk-in"], n)
+    starts64 = rng_datetime64(rng, n)
+    starts = starts64.tolist()
+    ends = (starts64 + minutes).tolist()
+    created = (starts64 - np.timedelta64(7, "D")).tolist()
+    uids = rng_uuids(rng, n)
+    doctors = rng_fks(rng, doctor_ids, n)
+    pharms = rng_fks(rng, pharmacy_ids, n)
     rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("patient_contacts")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "contact_id": None,  # could point to another patient if you want
-                    "relationship": random.choice(
-                        ["spouse", "parent", "child", "friend", "caregiver"]
-                    ),
-                    "preferred_contact_method": random.choice(
-                        ["phone", "email", "text"]
-                    ),
-                }
-            )
-    if rows:
-        conn.execute(patient_contacts.insert(), rows)
-
-
-def seed_document_filled_out(conn, patient_ids, doctor_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("document_filled_out")):
-            rows.append(
-                {
-                    "template_id": random.randint(1, 5),
-                    "patient_id": pid,
-                    "doctor_id": random.choice(doctor_ids) if doctor_ids else None,
-                    "date_filled": random_datetime_within(365),
-                    "data_json": '{"field1":"value1","field2":"value2"}',
-                    "notes": fake.text(max_nb_chars=80),
-                    "archived": random_bool(0.1),
-                }
-            )
-    if rows:
-        conn.execute(document_filled_out.insert(), rows)
-
-
-def seed_patient_identity_verification(conn, patient_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("patient_identity_verification")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "method": random.choice(["sms", "email", "id_check"]),
-                    "verified_at": random_datetime_within(365),
-                    "status": random.choice(["verified", "failed", "pending"]),
-                    "notes": fake.text(max_nb_chars=80),
-                }
-            )
-    if rows:
-        conn.execute(patient_identity_verification.insert(), rows)
-
-
-def seed_patient_lesion_history(conn, patient_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("patient_lesion_history")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "image_urls": "https://example.com/image1.jpg",
-                    "body_area": random.choice(
-                        ["face", "arm", "leg", "torso", "back", "scalp"]
-                    ),
-                    "is_facing_forward": random_bool(0.5),
-                    "x_location": random.randint(0, 1000),
-                    "y_location": random.randint(0, 1000),
-                    "questionnaire_data": '{"q1":"yes","q2":"no"}',
-                    "review_status": random.choice(
-                        ["pending", "reviewed", "needs_follow_up"]
-                    ),
-                    "date_examined": random_datetime_within(365),
-                    "ai_analysis": "low risk",
-                    "doctor_analysis": "monitor",
-                    "admin_comments": None,
-                    "lesion_uid": fake.uuid4(),
-                    "is_ai_correct": random_bool(0.8),
-                    "urgency_rating": random.randint(1, 5),
-                    "user_accepted_review": random_bool(0.9),
-                }
-            )
-    if rows:
-        conn.execute(patient_lesion_history.insert(), rows)
-
-
-def seed_patient_notes(conn, patient_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("patient_notes")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "note": fake.paragraph(nb_sentences=3),
-                    "created_at": random_datetime_within(365),
-                    "created_by": None,
-                }
-            )
-    if rows:
-        conn.execute(patient_notes.insert(), rows)
-
-
-def seed_promo_codes(conn, patient_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("promo_codes")):
-            code = fake.bothify(text="PROMO-####")
-            start = fake.date_between(start_date="-1y", end_date="today")
-            end = start + timedelta(days=random.randint(7, 60))
-            rows.append(
-                {
-                    "code": code,
-                    "patient_id": pid,
-                    "start_date": start,
-                    "end_date": end,
-                    "notes": fake.text(max_nb_chars=60),
-                    "archived": random_bool(0.2),
-                }
-            )
-    if rows:
-        conn.execute(promo_codes.insert(), rows)
-
-
-def seed_task_notes(conn, patient_ids):
+    for i, pid in enumerate(row_pids):
+        start = starts[i]
+        end = ends[i]
+        rows.append(
+            {
+                "appointment_uid": uids[i],
+                "patient_id": pid,
+                "doctor_id": doctors[i],
+                "start_time": start,
+                "end_time": end,
+                "status": status[i],
+                "visit_type": visit_type[i],
+                "created_at": created[i],
+                "created_by": None,
+                "updated_at": end,
+                "updated_by": None,
+                "notes": random.choice(TEXTS[80]),
+                "pharmacy_id": pharms[i],
+            }
+        )
+    return rows
+
+
+def build_patient_contacts_rows(row_pids, rng):
+    n = len(row_pids)
+    relationship = rng_choices(rng, ["spouse", "parent", "child", "friend", "caregiver"], n)
+    contact_method = rng_choices(rng, ["phone", "email", "text"], n)
+    return [
+        {
+            "patient_id": pid,
+            "contact_id": None,  # could point to another patient if you want
+            "relationship": relationship[i],
+            "preferred_contact_method": contact_method[i],
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_document_filled_out_rows(row_pids, rng, doctor_ids):
+    n = len(row_pids)
+    template_id = rng_ints(rng, 1, 5, n)
+    archived = rng_bools(rng, n, 0.1)
+    date_filled = rng_datetimes(rng, n)
+    doctors = rng_fks(rng, doctor_ids, n)
+    return [
+        {
+            "template_id": template_id[i],
+            "patient_id": pid,
+            "doctor_id": doctors[i],
+            "date_filled": date_filled[i],
+            "data_json": DOCUMENT_DATA_JSON,
+            "notes": random.choice(TEXTS[80]),
+            "archived": archived[i],
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_patient_identity_verification_rows(row_pids, rng):
+    n = len(row_pids)
+    method = rng_choices(rng, ["sms", "email", "id_check"], n)
+    status = rng_choices(rng, ["verified", "failed", "pending"], n)
+    verified_at = rng_datetimes(rng, n)
+    return [
+        {
+            "patient_id": pid,
+            "method": method[i],
+            "verified_at": verified_at[i],
+            "status": status[i],
+            "notes": random.choice(TEXTS[80]),
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_patient_lesion_history_rows(row_pids, rng):
+    n = len(row_pids)
+    body_area = rng_choices(rng, ["face", "arm", "leg", "torso", "back", "scalp"], n)
+    review_status = rng_choices(rng, ["pending", "reviewed", "needs_follow_up"], n)
+    xs, ys, urgency, facing_forward, ai_correct, accepted = lesion_numeric(rng, n)
+    date_examined = rng_datetimes(rng, n)
+    uids = rng_uuids(rng, n)
+    return [
+        {
+            "patient_id": pid,
+            "image_urls": "https://example.com/image1.jpg",
+            "body_area": body_area[i],
+            "is_facing_forward": facing_forward[i],
+            "x_location": xs[i],
+            "y_location": ys[i],
+            "questionnaire_data": QUESTIONNAIRE_JSON,
+            "review_status": review_status[i],
+            "date_examined": date_examined[i],
+            "ai_analysis": "low risk",
+            "doctor_analysis": "monitor",
+            "admin_comments": None,
+            "lesion_uid": uids[i],
+            "is_ai_correct": ai_correct[i],
+            "urgency_rating": urgency[i],
+            "user_accepted_review": accepted[i],
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_patient_notes_rows(row_pids, rng):
+    n = len(row_pids)
+    created_at = rng_datetimes(rng, n)
+    return [
+        {
+            "patient_id": pid,
+            "note": random.choice(PARAGRAPHS[3]),
+            "created_at": created_at[i],
+            "created_by": None,
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_promo_codes_rows(row_pids, rng):
+    n = len(row_pids)
+    archived = rng_bools(rng, n, 0.2)
+    starts64 = rng_dates64(rng, n, days_back=365)
+    starts = starts64.tolist()
+    ends = (starts64 + rng.integers(7, 61, n).astype("timedelta64[D]")).tolist()
     rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("task_notes")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "title": fake.sentence(nb_words=6),
-                    "note": fake.paragraph(nb_sentences=2),
-                    "created_at": random_datetime_within(365),
-                    "created_by": None,
-                    "completed": random_bool(0.5),
-                }
-            )
-    if rows:
-        conn.execute(task_notes.insert(), rows)
-
-
-def seed_uploaded_documents(conn, patient_ids):
+    for i, pid in enumerate(row_pids):
+        code = fake.bothify(text="PROMO-####")
+        start = starts[i]
+        end = ends[i]
+        rows.append(
+            {
+                "code": code,
+                "patient_id": pid,
+                "start_date": start,
+                "end_date": end,
+                "notes": random.choice(TEXTS[60]),
+                "archived": archived[i],
+            }
+        )
+    return rows
+
+
+def build_task_notes_rows(row_pids, rng):
+    n = len(row_pids)
+    completed = rng_bools(rng, n, 0.5)
+    created_at = rng_datetimes(rng, n)
+    return [
+        {
+            "patient_id": pid,
+            "title": random.choice(SENTENCES[6]),
+            "note": random.choice(PARAGRAPHS[2]),
+            "created_at": created_at[i],
+            "created_by": None,
+            "completed": completed[i],
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_uploaded_documents_rows(row_pids, rng):
+    n = len(row_pids)
+    size_bytes = rng_ints(rng, 10_000, 300_000, n)
+    archived = rng_bools(rng, n, 0.2)
+    uploaded_at = rng_datetimes(rng, n)
+    return [
+        {
+            "patient_id": pid,
+            "title": random.choice(SENTENCES[4]),
+            "file_name": fake.file_name(extension="pdf"),
+            "mime_type": "application/pdf",
+            "size_bytes": size_bytes[i],
+            "uploaded_at": uploaded_at[i],
+            "uploaded_by": None,
+            "archived": archived[i],
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_walkin_cases_rows(row_pids, rng):
+    n = len(row_pids)
+    status = rng_choices(rng, ["open", "in_progress", "closed", "cancelled"], n)
+    created_at = rng_datetimes(rng, n)
+    return [
+        {
+            "patient_id": pid,
+            "created_at": created_at[i],
+            "status": status[i],
+            "notes": random.choice(PARAGRAPHS[2]),
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_patient_last_measurement_rows(row_pids, rng):
+    n = len(row_pids)
+    height, weight, systolic, diastolic, pulse = measurement_numeric(rng, n)
+    measured_at = rng_datetimes(rng, n)
+    return [
+        {
+            "patient_id": pid,
+            "height_cm": height[i],
+            "weight_kg": weight[i],
+            "blood_pressure": f"{systolic[i]}/{diastolic[i]}",
+            "pulse": pulse[i],
+            "measured_at": measured_at[i],
+            "measured_by": None,
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_bills_rows(row_pids, rng):
+    n = len(row_pids)
+    amount, is_paid, days_to_pay = bill_numeric(rng, n)
+    unpaid_status = rng_choices(rng, ["unpaid", "cancelled"], n)
+    issued64 = rng_datetime64(rng, n)
+    issued_at = issued64.tolist()
+    paid_at = (issued64 + np.asarray(days_to_pay).astype("timedelta64[D]")).tolist()
     rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("uploaded_documents")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "title": fake.sentence(nb_words=4),
-                    "file_name": fake.file_name(extension="pdf"),
-                    "mime_type": "application/pdf",
-                    "size_bytes": random.randint(10_000, 300_000),
-                    "uploaded_at": random_datetime_within(365),
-                    "uploaded_by": None,
-                    "archived": random_bool(0.2),
-                }
-            )
-    if rows:
-        conn.execute(uploaded_documents.insert(), rows)
+    for i, pid in enumerate(row_pids):
+        issued = issued_at[i]
+        paid = paid_at[i] if is_paid[i] else None
+        status = "paid" if paid else unpaid_status[i]
+        rows.append(
+            {
+                "patient_id": pid,
+                "visit_number": fake.bothify(text="VIS-#####"),
+                "invoice_number": fake.bothify(text="INV-#####"),
+                "amount": amount[i],
+                "issued_at": issued,
+                "paid_at": paid,
+                "status": status,
+                "notes": random.choice(TEXTS[80]),
+            }
+        )
+    return rows
+
+
+def build_patient_history_rows(row_pids, rng):
+    n = len(row_pids)
+    change_type = rng_choices(rng, ["create", "update", "archive", "merge"], n)
+    changed_by = rng_choices(rng, ["system", "admin", "staff"], n)
+    changed_at = rng_datetimes(rng, n)
+    return [
+        {
+            "patient_id": pid,
+            "change_type": change_type[i],
+            "change_details": CHANGE_DETAILS_JSON,
+            "changed_by": changed_by[i],
+            # changed_at has default, but we can explicitly set as well
+            "changed_at": changed_at[i],
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+def build_submissions_rows(row_pids, rng):
+    n = len(row_pids)
+    submission_type = rng_choices(rng, ["intake_form", "questionnaire", "followup_form"], n)
+    submitted_by = rng_choices(rng, ["patient", "staff", "app"], n)
+    status = rng_choices(rng, ["pending", "reviewed", "archived"], n)
+    submitted_at = rng_datetimes(rng, n)
+    return [
+        {
+            "patient_id": pid,
+            "submission_type": submission_type[i],
+            "submitted_at": submitted_at[i],
+            "submitted_by": submitted_by[i],
+            "status": status[i],
+            "payload": QUESTIONNAIRE_JSON,
+            "notes": random.choice(TEXTS[80]),
+        }
+        for i, pid in enumerate(row_pids)
+    ]
+
+
+# (table, row builder, parent-id lists the builder takes). Every builder gets
+# the child rows' patient ids already expanded by sample_child_counts.
+CHILD_TABLES = [
+    (referral_logs, build_referral_logs_rows, ("doctor_ids", "pharmacy_ids")),
+    (appointments, build_appointments_rows, ("doctor_ids", "pharmacy_ids")),
+    (patient_contacts, build_patient_contacts_rows, ()),
+    (document_filled_out, build_document_filled_out_rows, ("doctor_ids",)),
+    (patient_identity_verification, build_patient_identity_verification_rows, ()),
+    (patient_lesion_history, build_patient_lesion_history_rows, ()),
+    (patient_notes, build_patient_notes_rows, ()),
+    (promo_codes, build_promo_codes_rows, ()),
+    (task_notes, build_task_notes_rows, ()),
+    (uploaded_documents, build_uploaded_documents_rows, ()),
+    (walkin_cases, build_walkin_cases_rows, ()),
+    (patient_last_measurement, build_patient_last_measurement_rows, ()),
+    (bills, build_bills_rows, ()),
+    (patient_history, build_patient_history_rows, ()),
+    (submissions, build_submissions_rows, ()),
+]
 
 
-def seed_walkin_cases(conn, patient_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("walkin_cases")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "created_at": random_datetime_within(365),
-                    "status": random.choice(
-                        ["open", "in_progress", "closed", "cancelled"]
-                    ),
-                    "notes": fake.paragraph(nb_sentences=2),
-                }
-            )
-    if rows:
-        conn.execute(walkin_cases.insert(), rows)
+def seed_child_table(conn, table, builder, row_pids, parent_ids):
+    rows = generate_rows(builder, row_pids, **parent_ids)
+    bulk_insert(conn, table, rows)
 
 
-def seed_patient_last_measurement(conn, patient_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("patient_last_measurement")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "height_cm": round(random.uniform(150, 195), 1),
-                    "weight_kg": round(random.uniform(50, 110), 1),
-                    "blood_pressure": f"{random.randint(100, 150)}/{random.randint(60, 95)}",
-                    "pulse": random.randint(55, 110),
-                    "measured_at": random_datetime_within(365),
-                    "measured_by": None,
-                }
-            )
-    if rows:
-        conn.execute(patient_last_measurement.insert(), rows)
+# --------------------------------------------------------------------
+# MAIN
+# --------------------------------------------------------------------
+def _seed_in_transaction(seeder, *args):
+    with engine.begin() as conn:
+        seeder(conn, *args)
 
 
-def seed_bills(conn, patient_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("bills")):
-            amount = round(random.uniform(50, 400), 2)
-            issued = random_datetime_within(365)
-            paid = issued + timedelta(days=random.randint(0, 60)) if random_bool(0.7) else None
-            status = "paid" if paid else random.choice(["unpaid", "cancelled"])
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "visit_number": fake.bothify(text="VIS-#####"),
-                    "invoice_number": fake.bothify(text="INV-#####"),
-                    "amount": amount,
-                    "issued_at": issued,
-                    "paid_at": paid,
-                    "status": status,
-                    "notes": fake.text(max_nb_chars=80),
-                }
-            )
-    if rows:
-        conn.execute(bills.insert(), rows)
+def seed_all():
+    global _pool
+    with Pool(NUM_WORKERS) as _pool:
+        # Parents commit first so the child transactions can see their ids.
+        with engine.begin() as conn:
+            print("Seeding doctors...")
+            doctor_ids = seed_doctors(conn)
 
+            print("Seeding pharmacies...")
+            pharmacy_ids = seed_pharmacies(conn)
 
-def seed_patient_history(conn, patient_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("patient_history")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "change_type": random.choice(
-                        ["create", "update", "archive", "merge"]
-                    ),
-                    "change_details": '{"field":"value_before->value_after"}',
-                    "changed_by": random.choice(["system", "admin", "staff"]),
-                    # changed_at has default, but we can explicitly set as well
-                    "changed_at": random_datetime_within(365),
-                }
-            )
-    if rows:
-        conn.execute(patient_history.insert(), rows)
+            # Optional: seed app users / roles if the auth table exists
+            auth_name, auth_table = try_load_auth_table(engine, metadata)
+            if auth_table is not None:
+                print(f"Seeding auth users (RBAC demo) into dbo.{auth_name}...")
+                seed_app_users(conn, auth_table, doctor_ids, pharmacy_ids)
+            else:
+                print("No auth table detected, skipping RBAC user seeding.")
 
+            print("Seeding patients...")
+            patient_ids = seed_patients(conn, doctor_ids, pharmacy_ids)
 
-def seed_submissions(conn, patient_ids):
-    rows = []
-    for pid in patient_ids:
-        for _ in range(per_patient_count("submissions")):
-            rows.append(
-                {
-                    "patient_id": pid,
-                    "submission_type": random.choice(
-                        ["intake_form", "questionnaire", "followup_form"]
-                    ),
-                    "submitted_at": random_datetime_within(365),
-                    "submitted_by": random.choice(["patient", "staff", "app"]),
-                    "status": random.choice(["pending", "reviewed", "archived"]),
-                    "payload": '{"q1":"yes","q2":"no"}',
-                    "notes": fake.text(max_nb_chars=80),
-                }
-            )
-    if rows:
-        conn.execute(submissions.insert(), rows)
+        print("Seeding dependent tables...")
+        parents = {"doctor_ids": doctor_ids, "pharmacy_ids": pharmacy_ids}
+        counts = sample_child_counts(
+            np.random.default_rng(stream_seed("child_counts")),
+            len(patient_ids),
+            [table.name for table, _, _ in CHILD_TABLES],
+        )
+        pids = np.array(patient_ids, dtype=np.int64)
+        with ThreadPoolExecutor(max_workers=INSERT_WORKERS) as ex:
+            futures = {}
+            for t_idx, (table, builder, parent_keys) in enumerate(CHILD_TABLES):
+                row_pids = np.repeat(pids, counts[:, t_idx]).tolist()
+                parent_ids = {key: parents[key] for key in parent_keys}
+                future = ex.submit(
+                    _seed_in_transaction, seed_child_table, table, builder, row_pids, parent_ids
+                )
+                futures[future] = table.name
+            failed = []
+            for future, name in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"[ERROR] {name} failed: {e}")
+                    failed.append(name)
+
+        if failed:
+            raise SystemExit(f"{len(failed)} child table(s) failed: {', '.join(failed)}")
 
 
-# --------------------------------------------------------------------
-# MAIN
-# --------------------------------------------------------------------
 def main():
+    disabled = []
     with engine.begin() as conn:
-        print("Seeding doctors...")
-        doctor_ids = seed_doctors(conn)
-
-        print("Seeding pharmacies...")
-        pharmacy_ids = seed_pharmacies(conn)
-
-        # Optional: seed app users / roles if the auth table exists
-        auth_name, auth_table = try_load_auth_table(engine, metadata)
-        if auth_table is not None:
-            print(f"Seeding auth users (RBAC demo) into dbo.{auth_name}...")
-            seed_app_users(conn, auth_table, doctor_ids, pharmacy_ids)
-        else:
-            print("No auth table detected, skipping RBAC user seeding.")
-
-        print("Seeding patients...")
-        patient_ids = seed_patients(conn, doctor_ids, pharmacy_ids)
-
-        print("Seeding dependent tables...")
-        seed_referral_logs(conn, patient_ids, doctor_ids, pharmacy_ids)
-        seed_appointments(conn, patient_ids, doctor_ids, pharmacy_ids)
-        seed_patient_contacts(conn, patient_ids)
-        seed_document_filled_out(conn, patient_ids, doctor_ids)
-        seed_patient_identity_verification(conn, patient_ids)
-        seed_patient_lesion_history(conn, patient_ids)
-        seed_patient_notes(conn, patient_ids)
-        seed_promo_codes(conn, patient_ids)
-        seed_task_notes(conn, patient_ids)
-        seed_uploaded_documents(conn, patient_ids)
-        seed_walkin_cases(conn, patient_ids)
-        seed_patient_last_measurement(conn, patient_ids)
-        seed_bills(conn, patient_ids)
-        seed_patient_history(conn, patient_ids)
-        seed_submissions(conn, patient_ids)
-
-        print("Done!")
+        if DISABLE_INDEXES:
+            disabled = disable_indexes(conn, SEED_TABLES)
+            print(f"Disabled {len(disabled)} nonclustered index(es).")
+        if DISABLE_CONSTRAINTS:
+            set_constraints(conn, SEED_TABLES, enabled=False)
+    try:
+        seed_all()
+    finally:
+        with engine.begin() as conn:
+            if disabled:
+                print("Rebuilding indexes...")
+                rebuild_indexes(conn, disabled)
+            if DISABLE_CONSTRAINTS:
+                print("Re-enabling constraints...")
+                set_constraints(conn, SEED_TABLES, enabled=True)
+    print("Done!")
 
 
 if __name__ == "__main__":
@@ -2,17 +2,45 @@
 Data analysis utilities – basic summaries, advanced analytics, and AI narrative.
 """
 
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 
-from src.config import MAX_CATEGORY_UNIQUE
+from src.config import MAX_CATEGORY_UNIQUE, ANALYSIS_ABOVE_ROWS, SUMMARY_ABOVE_CELLS
 
 
 # ── Basic analysis ───────────────────────────────────────────────────
 
+def _is_categorical(dtype) -> bool:
+    dtype_str = str(dtype)
+    return (
+        dtype == "object"
+        or dtype_str.startswith("category")
+        or dtype_str in ("str", "string", "String")
+        or hasattr(dtype, "na_value")  # pandas StringDtype
+    )
+
+
+def _numeric_describe(num: pd.DataFrame) -> pd.DataFrame:
+    """describe().T for numeric columns, from whole-frame reductions.
+
+    describe() summarises column by column; count/mean/std/min/max and one
+    quantile() call each run over all columns at once. Quartiles are left
+    out below four rows, where they say nothing the min/max don't.
+    """
+    parts = [num.count().rename("count"), num.mean().rename("mean"),
+             num.std().rename("std"), num.min().rename("min")]
+    if len(num) >= 4:
+        quartiles = num.quantile([0.25, 0.5, 0.75]).T
+        quartiles.columns = ["25%", "50%", "75%"]
+        parts.append(quartiles)
+    parts.append(num.max().rename("max"))
+    return pd.concat(parts, axis=1)
+
+
 def compute_basic_analysis(df: pd.DataFrame) -> Tuple[str, str]:
     """
     Basic numeric + categorical summaries.
@@ -26,38 +54,54 @@ def compute_basic_analysis(df: pd.DataFrame) -> Tuple[str, str]:
 
     num_cols = df.select_dtypes(include="number")
     if not num_cols.empty:
-        desc = num_cols.describe().T
-        numeric_summary = desc.to_markdown()
-
-    cat_frames = []
-    for col in df.columns:
-        dtype_str = str(df[col].dtype)
-        is_categorical = (
-            df[col].dtype == "object"
-            or dtype_str.startswith("category")
-            or dtype_str in ("str", "string", "String")
-            or hasattr(df[col].dtype, "na_value")  # pandas StringDtype
-        )
-        if is_categorical:
-            vals = df[col].dropna()
-            n_unique = vals.nunique()
-            if 0 < n_unique <= MAX_CATEGORY_UNIQUE:
-                vc = vals.value_counts().reset_index()
-                vc.columns = [col, "count"]
-                cat_frames.append(vc)
-
-    if cat_frames:
-        pieces = []
-        for vc in cat_frames:
-            col_name = vc.columns[0]
-            pieces.append(f"Column: {col_name}\n" + vc.to_markdown(index=False))
-        cat_summary = "\n\n".join(pieces)
+        numeric_summary = _numeric_describe(num_cols).round(2).to_string()
+
+    # Decide from df.dtypes, without building a Series per column.
+    cat_cols = [col for col, dtype in df.dtypes.items() if _is_categorical(dtype)]
+    if cat_cols:
+        # One nunique() over all text columns picks the small ones; one
+        # groupby over the melted frame then counts every kept column at once.
+        n_unique = df[cat_cols].nunique(dropna=True)
+        keep = n_unique[(n_unique > 0) & (n_unique <= MAX_CATEGORY_UNIQUE)].index
+        if len(keep):
+            long = df[keep].melt(var_name="column", value_name="value").dropna(subset=["value"])
+            counts = long.groupby(["column", "value"], sort=False, observed=True).size()
+            pieces = []
+            for col in keep:
+                vc = counts.loc[col].sort_values(ascending=False, kind="stable")
+                vc = vc.rename_axis(col).reset_index(name="count")
+                pieces.append(f"Column: {col}\n" + vc.to_string(index=False))
+            cat_summary = "\n\n".join(pieces)
 
     return numeric_summary, cat_summary
 
 
 # ── Advanced analysis ────────────────────────────────────────────────
 
+_ID_NAMES = {"id", "code"}
+_ID_SUFFIXES = ("_id", "_code", "_no")
+# Below this many rows an all-distinct integer column is unremarkable.
+_ID_MIN_ROWS = 20
+
+
+def _is_id_name(col: str) -> bool:
+    lower = col.lower()
+    return lower in _ID_NAMES or lower.endswith(_ID_SUFFIXES) or col.endswith(("Id", "ID"))
+
+
+def _correlation_matrix(numeric: pd.DataFrame) -> np.ndarray:
+    """Pearson correlations between the columns of *numeric*.
+
+    Without missing values this is one np.corrcoef (a single BLAS product);
+    with them, DataFrame.corr() keeps its pairwise-complete semantics.
+    """
+    x = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+    if len(x) < 2 or np.isnan(x).any():
+        return numeric.corr().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):  # constant columns give NaN, as in corr()
+        return np.corrcoef(x, rowvar=False)
+
+
 def compute_advanced_analysis(df: pd.DataFrame) -> str:
     """
     Next-level analysis: primary metric selection, tier segmentation,
@@ -66,8 +110,9 @@ def compute_advanced_analysis(df: pd.DataFrame) -> str:
     if df.empty:
         return "No advanced analysis: result has no rows."
 
-    numeric = df.select_dtypes(include="number").copy()
-    numeric = numeric.dropna(axis=1, how="all")
+    # Read-only from here on, so no defensive copy of the numeric columns.
+    numeric = df.select_dtypes(include="number")
+    numeric = numeric.loc[:, numeric.notna().any()]
 
     if numeric.empty:
         return "No advanced analysis: result has no numeric columns."
@@ -75,42 +120,52 @@ def compute_advanced_analysis(df: pd.DataFrame) -> str:
     lines: List[str] = []
 
     # Identify ID-like columns to skip
-    id_cols = [
-        c for c in numeric.columns
-        if "id" in c.lower() or c.lower().endswith("_id")
-    ]
-    metric_candidates = [c for c in numeric.columns if c not in id_cols]
+    metric_candidates = [c for c in numeric.columns if not _is_id_name(str(c))]
     primary_metric = metric_candidates[0] if metric_candidates else numeric.columns[0]
     s = numeric[primary_metric].dropna()
 
     lines.append(f"Primary metric used for deeper analysis: {primary_metric}")
 
-    if s.nunique() > 1:
-        q1, q2, q3 = s.quantile([0.25, 0.5, 0.75])
+    # Every statistic below comes from this one float array: min/max first
+    # (which also tell whether the metric varies at all), then a single
+    # np.quantile call for the quartiles and tier edges.
+    a = s.to_numpy(dtype=np.float64)
+    lo, hi = a.min(), a.max()
+    if (
+        len(s) >= _ID_MIN_ROWS
+        and pd.api.types.is_integer_dtype(s.dtype)
+        and s.nunique() > 0.9 * len(s)
+    ):
+        # Nearly every row distinct: a key, not a measurement. Tiers and
+        # outliers of it mean nothing, so go straight to correlations.
+        lines.append("Primary metric looks identifier-like; skipping quantile/outlier analysis.")
+    elif lo < hi:
+        q1, t1, q2, t2, q3 = np.quantile(a, [0.25, 1 / 3, 0.5, 2 / 3, 0.75])
         lines.append(
             f"{primary_metric}: median={q2:.2f}, IQR=[{q1:.2f}, {q3:.2f}], "
-            f"min={s.min():.2f}, max={s.max():.2f}."
+            f"min={lo:.2f}, max={hi:.2f}."
         )
 
-        # Quantile-based 3-tier segmentation
-        try:
-            tiers = pd.qcut(s, 3, labels=["low", "medium", "high"])
-            seg_counts = tiers.value_counts().sort_index()
-            total = len(s)
+        # Quantile-based 3-tier segmentation, binned like pd.qcut(s, 3)
+        # (right-closed, lowest value included) on the tertiles above.
+        if lo < t1 < t2 < hi:
+            n_low = int(np.count_nonzero(a <= t1))
+            n_medium = int(np.count_nonzero(a <= t2)) - n_low
+            total = len(a)
             lines.append("Quantile-based tiers for primary metric:")
-            for level, count in seg_counts.items():
+            for level, count in (("low", n_low), ("medium", n_medium),
+                                 ("high", total - n_low - n_medium)):
                 pct = count * 100.0 / total
                 lines.append(f"  - {level}: {count} rows ({pct:.1f}%)")
-        except ValueError:
+        else:
             lines.append("Not enough distinct values to build quantile-based tiers.")
 
         # Z-score outlier detection (> 2.5σ)
-        mean = s.mean()
-        std = s.std()
-        if std and std > 0:
-            z = (s - mean) / std
-            outliers = s[abs(z) > 2.5]
-            n_out = len(outliers)
+        mean = a.mean()
+        std = a.std(ddof=1)
+        if std > 0:
+            # |x - mean| > 2.5σ, without materialising the z-scores.
+            n_out = int(np.count_nonzero(np.abs(a - mean) > 2.5 * std))
             if n_out > 0:
                 frac = n_out * 100.0 / len(s)
                 lines.append(
@@ -124,20 +179,22 @@ def compute_advanced_analysis(df: pd.DataFrame) -> str:
 
     # Correlation analysis
     if numeric.shape[1] >= 2:
-        corr = numeric.corr()
-        pairs = []
-        cols = list(corr.columns)
-        for i in range(len(cols)):
-            for j in range(i + 1, len(cols)):
-                r = corr.iloc[i, j]
-                pairs.append((cols[i], cols[j], r, abs(r)))
-
-        strong_pairs = [p for p in pairs if p[3] >= 0.3]
-        strong_pairs.sort(key=lambda x: x[3], reverse=True)
-        if strong_pairs:
+        cols = numeric.columns
+        c = _correlation_matrix(numeric)
+        iu, ju = np.triu_indices_from(c, k=1)
+        r = c[iu, ju]
+        strong = np.flatnonzero(np.abs(r) >= 0.3)  # NaN never qualifies
+        if strong.size > 5:
+            # O(n) partition for the 5th-strongest |r|, so only the pairs at or
+            # above it (5 plus any ties) go through the sort below.
+            cutoff = np.partition(np.abs(r[strong]), strong.size - 5)[strong.size - 5]
+            strong = strong[np.abs(r[strong]) >= cutoff]
+        # Strongest first; stable so equal |r| keep column order.
+        strong = strong[np.argsort(-np.abs(r[strong]), kind="stable")][:5]
+        if strong.size:
             lines.append("Top numeric correlations (|r| ≥ 0.30):")
-            for col_a, col_b, r, _ in strong_pairs[:5]:
-                lines.append(f"  - {col_a} vs {col_b}: r = {r:.2f}")
+            for k in strong:
+                lines.append(f"  - {cols[iu[k]]} vs {cols[ju[k]]}: r = {r[k]:.2f}")
         else:
             lines.append("No strong numeric correlations (|r| ≥ 0.30) found.")
     else:
@@ -148,36 +205,65 @@ def compute_advanced_analysis(df: pd.DataFrame) -> str:
 
 # ── AI narrative summary ─────────────────────────────────────────────
 
-def summarize_result(
-    llm: ChatOpenAI,
+def quick_summary(df: pd.DataFrame) -> Optional[str]:
+    """
+    Summary for results too small to need the LLM (no rows, a single value
+    such as a COUNT(*), or fewer than SUMMARY_ABOVE_CELLS cells). Returns
+    None when a full narrative is warranted.
+    """
+    if df.empty:
+        return "The query returned no rows."
+    if df.shape == (1, 1):
+        return f"Result: {df.columns[0]} = {df.iat[0, 0]}."
+    if df.size < SUMMARY_ABOVE_CELLS:
+        rows, cols = df.shape
+        return (
+            f"The query returned {rows} row{'s' if rows != 1 else ''} and "
+            f"{cols} column{'s' if cols != 1 else ''}; see the result table."
+        )
+    return None
+
+
+def wants_advanced_analysis(df: pd.DataFrame) -> bool:
+    """Whether *df* is big enough for tiers/outliers/correlations to mean anything."""
+    return len(df) >= ANALYSIS_ABOVE_ROWS
+
+
+# Built once; identical on every call, so it also forms a cacheable prompt prefix.
+_SUMMARY_SYSTEM_MESSAGE = SystemMessage(
+    content=(
+        "You are a senior data analyst for a clinical research portal.\n"
+        "You will see:\n"
+        "1) The user's question\n"
+        "2) The SQL query that was run\n"
+        "3) A small preview of the result table\n"
+        "4) A numeric summary (pandas describe)\n"
+        "5) Simple categorical summaries (value counts)\n"
+        "6) An automatic advanced analysis (tiers, outliers, correlations)\n\n"
+        "Using all of that, provide a concise but insightful analysis:\n"
+        "- Directly answer the question.\n"
+        "- Mention key numbers (totals, averages, ranges, outliers).\n"
+        "- Highlight any obvious patterns or imbalances.\n"
+        "- Optionally comment on correlations or tiers if they matter.\n"
+        "- If there are no rows, clearly say so.\n"
+        "Write 3–7 sentences, no SQL and no markdown."
+    )
+)
+
+
+def _summary_messages(
     question: str,
     sql: str,
     df: pd.DataFrame,
     numeric_summary: str,
     cat_summary: str,
     advanced_summary: str,
-) -> str:
-    """Ask the LLM to produce a concise analytical summary."""
-    preview = df.head(10).to_markdown(index=False) if not df.empty else "(no rows)"
-
-    system = SystemMessage(
-        content=(
-            "You are a senior data analyst for a clinical research portal.\n"
-            "You will see:\n"
-            "1) The user's question\n"
-            "2) The SQL query that was run\n"
-            "3) A small preview of the result table\n"
-            "4) A numeric summary (pandas describe)\n"
-            "5) Simple categorical summaries (value counts)\n"
-            "6) An automatic advanced analysis (tiers, outliers, correlations)\n\n"
-            "Using all of that, provide a concise but insightful analysis:\n"
-            "- Directly answer the question.\n"
-            "- Mention key numbers (totals, averages, ranges, outliers).\n"
-            "- Highlight any obvious patterns or imbalances.\n"
-            "- Optionally comment on correlations or tiers if they matter.\n"
-            "- If there are no rows, clearly say so.\n"
-            "Write 3–7 sentences, no SQL and no markdown."
-        )
+) -> List[BaseMessage]:
+    # Tab-separated is as readable for the model as a markdown table and far
+    # cheaper to build.
+    preview = (
+        df.head(10).to_csv(index=False, sep="\t", lineterminator="\n").rstrip("\n")
+        if not df.empty else "(no rows)"
     )
     human = HumanMessage(
         content=(
@@ -189,5 +275,35 @@ def summarize_result(
             f"Advanced analysis (tiers, outliers, correlations):\n{advanced_summary}\n"
         )
     )
-    resp = llm.invoke([system, human])
+    return [_SUMMARY_SYSTEM_MESSAGE, human]
+
+
+def summarize_result(
+    llm: ChatOpenAI,
+    question: str,
+    sql: str,
+    df: pd.DataFrame,
+    numeric_summary: str,
+    cat_summary: str,
+    advanced_summary: str,
+) -> str:
+    """Ask the LLM to produce a concise analytical summary."""
+    messages = _summary_messages(question, sql, df, numeric_summary, cat_summary, advanced_summary)
+    resp = llm.invoke(messages)
     return resp.content.strip()
+
+
+def stream_summary(
+    llm: ChatOpenAI,
+    question: str,
+    sql: str,
+    df: pd.DataFrame,
+    numeric_summary: str,
+    cat_summary: str,
+    advanced_summary: str,
+) -> Iterator[str]:
+    """Like summarize_result, but yield the text as the model produces it."""
+    messages = _summary_messages(question, sql, df, numeric_summary, cat_summary, advanced_summary)
+    for chunk in llm.stream(messages):
+        if chunk.content:
+            yield chunk.content
@@ -9,8 +9,8 @@ import traceback
 from flask import Flask
 from flask_cors import CORS
 
-from src.config import TOKEN_EXPIRY_HOURS
-from src.database import init_engine, build_schema_summary
+from src.config import TOKEN_EXPIRY_HOURS, HEALTH_POOL_SIZE
+from src.database import init_engine, get_schema_cached
 from src.llm import init_llm
 from src.api.routes import register_routes
 
@@ -24,12 +24,14 @@ def create_app():
     try:
         print("[init] Initializing database connection...")
         engine = init_engine()
+        # Separate pool so frequent health probes never wait behind queries.
+        health_engine = init_engine(pool_size=HEALTH_POOL_SIZE, max_overflow=0)
 
         print("[init] Initializing LLM...")
         llm = init_llm()
 
         print("[init] Building schema summary...")
-        schema_text = build_schema_summary(engine)
+        get_schema_cached(engine)
 
         print("[init] ✓ API server ready")
     except Exception as e:
@@ -38,7 +40,9 @@ def create_app():
         sys.exit(1)
 
     # ── Register routes ──────────────────────────────────────────────
-    register_routes(app, engine, llm, schema_text)
+    register_routes(
+        app, engine, llm, lambda: get_schema_cached(engine), health_engine=health_engine
+    )
 
     return app
 
@@ -1,47 +1,45 @@
 """
-JWT authentication helpers and middleware for the Flask API.
+Bearer-token authentication helpers and middleware for the Flask API.
 """
 
-import os
-from datetime import datetime, timedelta
+import secrets
+from datetime import datetime, timezone
 from functools import wraps
-from typing import Dict, Any, Optional
+from typing import Dict, Any, MutableMapping, Optional
 
-import jwt
-from flask import request, jsonify
+from flask import request
 
-from src.config import SECRET_KEY, TOKEN_EXPIRY_HOURS
-from src.models import AccessContext
+from src.config import TOKEN_EXPIRY_HOURS
+from src.api.responses import json_response
+from src.api.session_store import create_session_store
 
-# In-memory session store (use Redis in production)
+# Session store: bounded in-memory TTL cache, or Redis when REDIS_URL is set
 # Structure: {token: {"ctx": AccessContext, "policy": Policy, "created_at": datetime, ...}}
-sessions: Dict[str, Dict[str, Any]] = {}
+sessions: MutableMapping[str, Dict[str, Any]] = create_session_store()
 
 
-def generate_token(ctx: AccessContext) -> str:
-    """Generate a JWT token for an authenticated user."""
-    payload = {
-        "user_id": ctx.user_id,
-        "role": ctx.role,
-        "display_name": ctx.display_name,
-        "iat": datetime.utcnow(),
-        "exp": datetime.utcnow() + timedelta(hours=TOKEN_EXPIRY_HOURS),
-    }
-    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+def utc_now() -> datetime:
+    """Naive UTC timestamp: the one clock used for tokens and session activity."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
-def verify_token(token: str) -> Optional[Dict[str, Any]]:
-    """Verify a JWT token and return the decoded payload (or None)."""
-    try:
-        return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
+def generate_token() -> str:
+    """Generate an opaque bearer token (256 random bits) for a new session.
+
+    The token is only a key into ``sessions``, which holds all the state, so
+    there is no signature to verify per request.
+    """
+    return secrets.token_urlsafe(32)
+
+
+def session_expired(session_data: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    """True once a session is older than TOKEN_EXPIRY_HOURS, however active it is."""
+    now = now or utc_now()
+    return (now - session_data["created_at"]).total_seconds() > TOKEN_EXPIRY_HOURS * 3600
 
 
 def token_required(f):
-    """Decorator that protects endpoints with JWT authentication."""
+    """Decorator that protects endpoints with bearer-token authentication."""
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
@@ -52,7 +50,7 @@ def token_required(f):
             try:
                 token = auth_header.split(" ")[1]
             except IndexError:
-                return jsonify({"error": "Invalid authorization header format"}), 401
+                return json_response({"error": "Invalid authorization header format"}, 401)
 
         # Fallback: check token in JSON body or query params
         if not token:
@@ -61,32 +59,19 @@ def token_required(f):
             token = request.args.get("token")
 
         if not token:
-            return jsonify({"error": "Authentication token is missing"}), 401
+            return json_response({"error": "Authentication token is missing"}, 401)
 
-        payload = verify_token(token)
-        if not payload:
-            return jsonify({"error": "Invalid or expired token"}), 401
-
-        if token not in sessions:
-            return jsonify({"error": "Session not found. Please login again."}), 401
+        session_data = sessions.get(token)
+        if session_data is None:
+            return json_response({"error": "Invalid or expired token"}, 401)
+        if session_expired(session_data):
+            sessions.pop(token, None)
+            return json_response({"error": "Invalid or expired token"}, 401)
 
         # Attach session data to the request context
-        request.session_data = sessions[token]
+        request.session_data = session_data
         request.token = token
 
         return f(*args, **kwargs)
 
     return decorated
-
-
-def cleanup_expired_sessions():
-    """Remove sessions that have been inactive beyond TOKEN_EXPIRY_HOURS."""
-    now = datetime.utcnow()
-    expired = [
-        tok for tok, data in sessions.items()
-        if (now - data["last_activity"]).total_seconds() > TOKEN_EXPIRY_HOURS * 3600
-    ]
-    for tok in expired:
-        del sessions[tok]
-    if expired:
-        print(f"[cleanup] Removed {len(expired)} expired sessions")
@@ -0,0 +1,85 @@
+"""
+Fast response serialisation for the API (orjson, plus optional Arrow IPC).
+"""
+
+from decimal import Decimal
+
+import orjson
+import pandas as pd
+from flask import Response
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: Arrow responses are only offered when installed
+    pa = None
+
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj):
+    # pandas Timestamps (and anything date-like orjson doesn't take natively)
+    # go out as ISO-8601; Decimals keep their exact string form.
+    if obj is pd.NaT:
+        return None
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if hasattr(obj, "item"):  # numpy / pandas scalars
+        return obj.item()
+    return str(obj)
+
+
+def dumps(obj) -> bytes:
+    """Serialise *obj* to JSON bytes with orjson; NaN/NaT become null."""
+    return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+
+def _column_values(df: pd.DataFrame) -> list:
+    # tolist() unboxes a whole column to Python scalars in C, so rows are plain
+    # zips and orjson rarely needs the ``_default`` fallback.
+    return [df.iloc[:, i].tolist() for i in range(df.shape[1])]
+
+
+def frame_records(df: pd.DataFrame) -> list:
+    """``df.to_dict(orient="records")``, built from one ``tolist()`` per column."""
+    cols = df.columns.tolist()
+    return [dict(zip(cols, row)) for row in zip(*_column_values(df))]
+
+
+def frame_rows(df: pd.DataFrame) -> list:
+    """Rows as plain lists, in ``df.columns`` order (``orient="split"`` data)."""
+    return [list(row) for row in zip(*_column_values(df))]
+
+
+def json_response(obj, status: int = 200) -> Response:
+    """Drop-in for ``jsonify(obj), status`` that serialises with orjson.
+
+    Bytes are taken to be JSON serialised ahead of time and sent as is.
+    """
+    body = obj if isinstance(obj, bytes) else dumps(obj)
+    return Response(body, status=status, mimetype="application/json")
+
+
+def wants_arrow(req) -> bool:
+    """True when the client asked for Arrow IPC and pyarrow is available."""
+    return pa is not None and ARROW_STREAM_MIMETYPE in req.headers.get("Accept", "")
+
+
+def arrow_response(df, metadata: dict, status: int = 200) -> Response:
+    """Stream *df* as an Arrow IPC stream.
+
+    *metadata* (the rest of the JSON response: counts, analysis, sql, ...) is
+    embedded as JSON under the ``aicp`` key of the Arrow schema metadata.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"aicp": dumps(metadata),
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(sink.getvalue().to_pybytes(), status=status, mimetype=ARROW_STREAM_MIMETYPE)
@@ -3,93 +3,168 @@ Flask route handlers for the REST API.
 """
 
 import os
-import sys
-import traceback
+import time
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
-from datetime import datetime, timedelta
+from datetime import timedelta
+from functools import lru_cache
 
-import pandas as pd
-from flask import request, jsonify
+from flask import request
+from sqlalchemy import text as sa_text
 
-from src.config import TOKEN_EXPIRY_HOURS, MAX_RESULTS_RETURN, QUERY_ROUTE_TIMEOUT_SEC
+from src.config import (
+    TOKEN_EXPIRY_HOURS, MAX_RESULTS_RETURN, MAX_PREVIEW_ROWS, QUERY_ROUTE_TIMEOUT_SEC, QUERY_MAX_WORKERS,
+    HEALTH_CACHE_TTL_SEC, SQL_CACHE_SIZE, SQL_CACHE_TTL_SEC, ACCESS_CACHE_SIZE, ACCESS_CACHE_TTL_SEC,
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SEC, SESSION_TOUCH_INTERVAL_SEC,
+)
+from src.cache import TTLCache
+from src.log import get_logger
 from src.rbac import load_access_context, build_policy
-from src.sql_generator import generate_sql
-from src.analysis import compute_basic_analysis, compute_advanced_analysis, summarize_result
+from src.sql_generator import generate_sql, apply_row_limit, has_row_limit, sql_cache_key
+from src.database import read_query_frame
+from src.analysis import (
+    compute_basic_analysis, compute_advanced_analysis, summarize_result, quick_summary,
+    wants_advanced_analysis,
+)
+from src.api.responses import (
+    dumps, json_response, wants_arrow, arrow_response, frame_records, frame_rows,
+)
 from src.api.auth import (
     sessions,
     generate_token,
     token_required,
+    utc_now,
 )
 
 
-def register_routes(app, engine, llm, schema_text):
-    """Register all API routes on the Flask *app*."""
+logger = get_logger("api")
+
+
+# ── Pre-serialised bodies ────────────────────────────────────────────
+
+_INDEX_BODY = dumps({
+    "service": "AICP Research Portal API",
+    "version": "1.0.0",
+    "status": "running",
+    "endpoints": {
+        "auth": "/api/auth/login",
+        "query": "/api/query",
+        "schema": "/api/schema",
+        "logout": "/api/auth/logout",
+        "health": "/health",
+    },
+})
+
+_LIVE_BODY = dumps({"status": "alive"})
+
+
+@lru_cache(maxsize=128)
+def _error_body(error: str, message: str) -> bytes:
+    # Error handler messages are almost always werkzeug's stock descriptions.
+    return dumps({"error": error, "message": message})
+
+
+def register_routes(app, engine, llm, schema_text, health_engine=None):
+    """Register all API routes on the Flask *app*.
+
+    *schema_text* is the schema summary, or a zero-argument callable that
+    returns the current one (so schema changes are picked up without a
+    restart). *health_engine* serves /health's DB probe; it falls back to
+    *engine*.
+    """
+    current_schema = schema_text if callable(schema_text) else (lambda: schema_text)
 
     # ── Health / info ────────────────────────────────────────────────
 
     @app.route("/", methods=["GET"])
     def index():
-        return jsonify({
-            "service": "AICP Research Portal API",
-            "version": "1.0.0",
-            "status": "running",
-            "endpoints": {
-                "auth": "/api/auth/login",
-                "query": "/api/query",
-                "schema": "/api/schema",
-                "logout": "/api/auth/logout",
-                "health": "/health",
-            },
-        })
-
-    @app.route("/health", methods=["GET"])
-    def health():
-        from sqlalchemy import text as sa_text
-
-        checks = {"database": False, "llm": False, "schema": False}
+        return json_response(_INDEX_BODY)
+
+    probe_engine = health_engine or engine
+    _last_db_check = {"ts": float("-inf"), "ok": False}
+
+    def _database_ok() -> bool:
+        # Probes arrive every few seconds; reuse a recent answer instead of
+        # round-tripping SELECT 1 for each one.
+        now = time.monotonic()
+        if now - _last_db_check["ts"] < HEALTH_CACHE_TTL_SEC:
+            return _last_db_check["ok"]
+        ok = False
         try:
-            if engine:
-                with engine.connect() as conn:
+            if probe_engine:
+                with probe_engine.connect() as conn:
                     conn.execute(sa_text("SELECT 1"))
-                checks["database"] = True
+                ok = True
         except Exception:
             pass
+        _last_db_check.update(ts=now, ok=ok)
+        return ok
+
+    _last_session_count = {"ts": float("-inf"), "n": 0}
 
-        checks["llm"] = llm is not None
-        checks["schema"] = schema_text is not None
+    def _active_sessions() -> int:
+        # Counting walks the whole store (a SCAN with Redis); probes reuse a
+        # recent count on the same TTL as the DB check.
+        now = time.monotonic()
+        if now - _last_session_count["ts"] >= HEALTH_CACHE_TTL_SEC:
+            _last_session_count.update(ts=now, n=len(sessions))
+        return _last_session_count["n"]
+
+    @app.route("/healthz", methods=["GET"])
+    def liveness():
+        # Liveness: the process is up and serving. No DB, LLM or session checks.
+        return json_response(_LIVE_BODY)
+
+    @app.route("/health", methods=["GET"])
+    @app.route("/readyz", methods=["GET"])
+    def health():
+        checks = {
+            "database": _database_ok(),
+            "llm": llm is not None,
+            "schema": current_schema() is not None,
+        }
         all_healthy = all(checks.values())
 
-        return jsonify({
+        return json_response({
             "status": "healthy" if all_healthy else "unhealthy",
             "checks": checks,
-            "active_sessions": len(sessions),
-        }), 200 if all_healthy else 503
+            "active_sessions": _active_sessions(),
+            "db_pool": engine.pool.status() if engine else None,
+        }, 200 if all_healthy else 503)
 
     # ── Auth ─────────────────────────────────────────────────────────
 
+    # api_key -> (ctx, policy); only successful lookups are kept.
+    _access_cache = TTLCache(maxsize=ACCESS_CACHE_SIZE, ttl_seconds=ACCESS_CACHE_TTL_SEC)
+
     @app.route("/api/auth/login", methods=["POST"])
     def login():
         if not request.is_json:
-            return jsonify({"error": "Content-Type must be application/json"}), 400
+            return json_response({"error": "Content-Type must be application/json"}, 400)
 
         data = request.json
         api_key = data.get("api_key", "").strip()
         if not api_key:
-            return jsonify({"error": "api_key is required"}), 400
+            return json_response({"error": "api_key is required"}, 400)
 
         try:
-            ctx = load_access_context(engine, api_key)
-            policy = build_policy(ctx)
-            token = generate_token(ctx)
+            cached = _access_cache.get(api_key)
+            if cached is None:
+                ctx = load_access_context(engine, api_key)
+                policy = build_policy(ctx)
+                _access_cache.set(api_key, (ctx, policy))
+            else:
+                ctx, policy = cached
+            now = utc_now()
+            token = generate_token()
 
             sessions[token] = {
                 "ctx": ctx,
                 "policy": policy,
-                "created_at": datetime.utcnow(),
-                "last_activity": datetime.utcnow(),
+                "created_at": now,
+                "last_activity": now,
             }
 
-            return jsonify({
+            return json_response({
                 "success": True,
                 "token": token,
                 "user": {
@@ -104,73 +179,91 @@ def register_routes(app, engine, llm, schema_text):
                     "notes": policy.notes,
                     "scope_filter_hint": policy.scope_filter_hint,
                 },
-                "expires_at": (datetime.utcnow() + timedelta(hours=TOKEN_EXPIRY_HOURS)).isoformat(),
-            }), 200
+                "expires_at": (now + timedelta(hours=TOKEN_EXPIRY_HOURS)).isoformat(),
+            }, 200)
 
         except ValueError as e:
-            return jsonify({"error": f"Authentication failed: {str(e)}"}), 401
+            return json_response({"error": f"Authentication failed: {str(e)}"}, 401)
         except Exception as e:
-            print(f"[ERROR] Login error: {e}", file=sys.stderr)
-            traceback.print_exc()
-            return jsonify({"error": "Internal server error during login"}), 500
+            logger.exception("Login error: %s", e)
+            return json_response({"error": "Internal server error during login"}, 500)
 
     @app.route("/api/auth/logout", methods=["POST"])
     @token_required
     def logout():
-        token = request.token
-        if token in sessions:
-            del sessions[token]
-        return jsonify({"success": True, "message": "Logged out successfully"}), 200
+        sessions.pop(request.token, None)
+        return json_response({"success": True, "message": "Logged out successfully"}, 200)
 
     # ── Query ────────────────────────────────────────────────────────
 
-    _query_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="query")
+    _sql_cache = TTLCache(maxsize=SQL_CACHE_SIZE, ttl_seconds=SQL_CACHE_TTL_SEC)
+    # Whole answers (result dict + rows) for repeats of a question in the same scope.
+    _response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl_seconds=RESPONSE_CACHE_TTL_SEC)
+    _query_executor = ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS, thread_name_prefix="query")
 
     @app.route("/api/query", methods=["POST"])
     @token_required
     def execute_query():
-        start_time = datetime.utcnow()
+        start_ns = time.perf_counter_ns()
 
         if not request.is_json:
-            return jsonify({"error": "Content-Type must be application/json"}), 400
+            return json_response({"error": "Content-Type must be application/json"}, 400)
 
         data = request.json
         question = data.get("question", "").strip()
         include_sql = data.get("include_sql", True)
-        max_rows = min(data.get("max_rows", MAX_RESULTS_RETURN), MAX_RESULTS_RETURN)
+        max_rows = max(min(data.get("max_rows", MAX_RESULTS_RETURN), MAX_RESULTS_RETURN), 0)
+        # "split" sends data/preview as row lists in `columns` order, without
+        # repeating every column name in every row.
+        orient = data.get("orient", "records")
 
         if not question:
-            return jsonify({"error": "question is required"}), 400
+            return json_response({"error": "question is required"}, 400)
+        if orient not in ("records", "split"):
+            return json_response({"error": "orient must be 'records' or 'split'"}, 400)
 
         session_data = request.session_data
         ctx = session_data["ctx"]
         policy = session_data["policy"]
-        session_data["last_activity"] = datetime.utcnow()
+        now = utc_now()
+        if (now - session_data["last_activity"]).total_seconds() >= SESSION_TOUCH_INTERVAL_SEC:
+            session_data["last_activity"] = now
+            sessions[request.token] = session_data  # persist and restart the idle TTL
 
         def run_query():
-            sql = generate_sql(llm, schema_text, policy, question)
-            with engine.connect() as conn:
-                df = pd.read_sql_query(sql, conn)
-            df_limited = df.head(max_rows) if len(df) > max_rows else df
+            sql = generate_sql(llm, current_schema(), policy, question, cache=_sql_cache)
+            # Fetch one row past the cap (so truncation is still detectable)
+            # and let the server apply it via TOP where the query allows.
+            bounded_sql = apply_row_limit(sql, max_rows + 1)
+            df = read_query_frame(
+                engine, bounded_sql, max_rows + 1, server_bounded=has_row_limit(bounded_sql)
+            )
+            truncated = len(df) > max_rows
+            df_limited = df.head(max_rows) if truncated else df
             numeric_summary, cat_summary = compute_basic_analysis(df_limited)
-            advanced_summary = compute_advanced_analysis(df_limited)
-            try:
-                ai_summary = summarize_result(
-                    llm, question, sql, df_limited,
-                    numeric_summary, cat_summary, advanced_summary,
-                )
-            except Exception as e:
-                print(f"[WARN] AI summary generation failed: {e}", file=sys.stderr)
-                ai_summary = "AI summary unavailable."
-            execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
+            # Tiny results are answered directly: tiers, outliers and an LLM
+            # narrative cost more than they tell.
+            if wants_advanced_analysis(df_limited):
+                advanced_summary = compute_advanced_analysis(df_limited)
+            else:
+                advanced_summary = "No advanced analysis: result is too small."
+            ai_summary = quick_summary(df_limited)
+            if ai_summary is None:
+                try:
+                    ai_summary = summarize_result(
+                        llm, question, sql, df_limited,
+                        numeric_summary, cat_summary, advanced_summary,
+                    )
+                except Exception as e:
+                    logger.warning("AI summary generation failed: %s", e)
+                    ai_summary = "AI summary unavailable."
+            execution_time = (time.perf_counter_ns() - start_ns) / 1e6
             result = {
                 "success": True,
                 "question": question,
-                "row_count": len(df),
+                "row_count": len(df_limited),
                 "column_count": len(df.columns),
                 "columns": df.columns.tolist(),
-                "data": df_limited.to_dict(orient="records"),
-                "preview": df_limited.head(20).to_dict(orient="records"),
                 "analysis": {
                     "numeric_summary": numeric_summary,
                     "categorical_summary": cat_summary,
@@ -178,40 +271,65 @@ def register_routes(app, engine, llm, schema_text):
                     "ai_summary": ai_summary,
                 },
                 "execution_time_ms": round(execution_time, 2),
-                "truncated": len(df) > max_rows,
+                "truncated": truncated,
             }
             if include_sql:
                 result["sql"] = sql
-            return result
+            if not arrow:
+                # Build the records once; the preview is just the head of it.
+                records = frame_rows(df_limited) if orient == "split" else frame_records(df_limited)
+                result["data"] = records
+                result["preview"] = records[:MAX_PREVIEW_ROWS]
+            return result, df_limited
+
+        arrow = wants_arrow(request)
+        response_key = (
+            sql_cache_key(current_schema(), policy, question), max_rows, bool(include_sql), arrow, orient,
+        )
+        hit = _response_cache.get(response_key)
+        if hit is not None:
+            result, df_limited = hit
+            # The key normalises whitespace, so echo this request's own wording.
+            result = {
+                **result,
+                "question": question,
+                "cached": True,
+                "execution_time_ms": round((time.perf_counter_ns() - start_ns) / 1e6, 2),
+            }
+            if arrow:
+                return arrow_response(df_limited, result)
+            return json_response(result)
 
         try:
             future = _query_executor.submit(run_query)
-            result = future.result(timeout=QUERY_ROUTE_TIMEOUT_SEC)
-            return jsonify(result), 200
+            result, df_limited = future.result(timeout=QUERY_ROUTE_TIMEOUT_SEC)
+            _response_cache.set(response_key, (result, df_limited))
+            if arrow:
+                return arrow_response(df_limited, result)
+            return json_response(result)
         except FuturesTimeoutError:
-            print(f"[WARN] Query timed out after {QUERY_ROUTE_TIMEOUT_SEC}s", file=sys.stderr)
-            return jsonify({
+            logger.warning("Query timed out after %ss", QUERY_ROUTE_TIMEOUT_SEC)
+            return json_response({
                 "success": False,
                 "error": "Query timed out",
                 "details": f"The request took longer than {QUERY_ROUTE_TIMEOUT_SEC} seconds.",
                 "question": question,
-            }), 504
+            }, 504)
         except ValueError as e:
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "Query validation failed",
                 "details": str(e),
                 "question": question,
-            }), 403
+            }, 403)
         except Exception as e:
-            print(f"[ERROR] Query execution error: {e}", file=sys.stderr)
-            traceback.print_exc()
-            return jsonify({
+            logger.exception("Query execution error: %s", e)
+            return json_response({
                 "success": False,
                 "error": "Query execution failed",
                 "details": str(e),
                 "question": question,
-            }), 500
+            }, 500)
 
     # ── Schema / profile ─────────────────────────────────────────────
 
@@ -220,12 +338,12 @@ def register_routes(app, engine, llm, schema_text):
     def get_schema():
         session_data = request.session_data
         policy = session_data["policy"]
-        return jsonify({
+        return json_response({
             "success": True,
-            "schema": schema_text,
+            "schema": current_schema(),
             "policy_notes": policy.notes,
             "role": policy.role,
-        }), 200
+        }, 200)
 
     @app.route("/api/user/profile", methods=["GET"])
     @token_required
@@ -233,7 +351,7 @@ def register_routes(app, engine, llm, schema_text):
         session_data = request.session_data
         ctx = session_data["ctx"]
         policy = session_data["policy"]
-        return jsonify({
+        return json_response({
             "success": True,
             "user": {
                 "id": ctx.user_id,
@@ -250,12 +368,12 @@ def register_routes(app, engine, llm, schema_text):
                 "created_at": session_data["created_at"].isoformat(),
                 "last_activity": session_data["last_activity"].isoformat(),
             },
-        }), 200
+        }, 200)
 
     @app.route("/api/sessions", methods=["GET"])
     def get_sessions_info():
         if os.getenv("FLASK_ENV") != "development":
-            return jsonify({"error": "Not available in production"}), 403
+            return json_response({"error": "Not available in production"}, 403)
 
         sessions_info = []
         for _token, data in sessions.items():
@@ -267,21 +385,21 @@ def register_routes(app, engine, llm, schema_text):
                 "created_at": data["created_at"].isoformat(),
                 "last_activity": data["last_activity"].isoformat(),
             })
-        return jsonify({
+        return json_response({
             "active_sessions": len(sessions),
             "sessions": sessions_info,
-        }), 200
+        }, 200)
 
     # ── Error handlers ───────────────────────────────────────────────
 
     @app.errorhandler(404)
     def not_found(e):
-        return jsonify({"error": "Endpoint not found", "message": str(e)}), 404
+        return json_response(_error_body("Endpoint not found", str(e)), 404)
 
     @app.errorhandler(405)
     def method_not_allowed(e):
-        return jsonify({"error": "Method not allowed", "message": str(e)}), 405
+        return json_response(_error_body("Method not allowed", str(e)), 405)
 
     @app.errorhandler(500)
     def internal_error(e):
-        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+        return json_response(_error_body("Internal server error", str(e)), 500)
@@ -0,0 +1,130 @@
+"""
+Session storage for the API: a process-local TTL cache, or Redis when REDIS_URL is set.
+
+Both stores are drop-in MutableMappings so the rest of the API keeps using
+``sessions[token]`` / ``token in sessions``. Every write restarts an entry's
+TTL (SETEX in Redis), so idle sessions expire on their own with no sweep,
+and with Redis every worker sees the same sessions.
+"""
+
+import pickle
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator
+
+from src.cache import TTLCache
+from src.config import REDIS_URL, REDIS_MAX_CONNECTIONS, TOKEN_EXPIRY_HOURS, SESSION_MAX_ACTIVE
+from src.log import get_logger
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+logger = get_logger("sessions")
+
+
+_MISSING = object()
+
+
+class MemorySessionStore(MutableMapping):
+    """token -> session dict in a bounded TTLCache.
+
+    Expired entries are dropped when next touched, and past *maxsize* the
+    least recently used session is evicted, so memory stays bounded.
+    """
+
+    def __init__(self, ttl_seconds: int, maxsize: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+
+    def __getitem__(self, token: str) -> Dict[str, Any]:
+        data = self._cache.get(token, _MISSING)
+        if data is _MISSING:
+            raise KeyError(token)
+        return data
+
+    def __setitem__(self, token: str, data: Dict[str, Any]) -> None:
+        self._cache.set(token, data)
+
+    def __delitem__(self, token: str) -> None:
+        if self._cache.pop(token, _MISSING) is _MISSING:
+            raise KeyError(token)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([tok for tok, _ in self._cache.items()])
+
+    def __len__(self) -> int:
+        return len(self._cache.items())
+
+    def items(self):
+        return self._cache.items()
+
+
+class RedisSessionStore(MutableMapping):
+    """token -> session dict, pickled under ``<prefix><token>`` with a TTL."""
+
+    def __init__(self, client, ttl_seconds: int, prefix: str = "sess:"):
+        self._r = client
+        self._ttl = ttl_seconds
+        self._prefix = prefix
+
+    def _key(self, token: str) -> str:
+        return f"{self._prefix}{token}"
+
+    def __getitem__(self, token: str) -> Dict[str, Any]:
+        raw = self._r.get(self._key(token))
+        if raw is None:
+            raise KeyError(token)
+        return pickle.loads(raw)
+
+    def __setitem__(self, token: str, data: Dict[str, Any]) -> None:
+        self._r.setex(self._key(token), self._ttl, pickle.dumps(data))
+
+    def __delitem__(self, token: str) -> None:
+        if not self._r.delete(self._key(token)):
+            raise KeyError(token)
+
+    def __contains__(self, token) -> bool:
+        return bool(self._r.exists(self._key(token)))
+
+    def __iter__(self) -> Iterator[str]:
+        plen = len(self._prefix)
+        for key in self._r.scan_iter(match=f"{self._prefix}*"):
+            key = key.decode() if isinstance(key, bytes) else key
+            yield key[plen:]
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._r.scan_iter(match=f"{self._prefix}*"))
+
+    def items(self):
+        # One pipelined MGET-style round-trip instead of a GET per session.
+        tokens = list(self)
+        if not tokens:
+            return []
+        pipe = self._r.pipeline()
+        for tok in tokens:
+            pipe.get(self._key(tok))
+        return [
+            (tok, pickle.loads(raw))
+            for tok, raw in zip(tokens, pipe.execute())
+            if raw is not None
+        ]
+
+
+def create_session_store() -> MutableMapping:
+    """Redis-backed store if REDIS_URL is configured and reachable, else in-memory."""
+    ttl_seconds = TOKEN_EXPIRY_HOURS * 3600
+    if not REDIS_URL:
+        return MemorySessionStore(ttl_seconds, maxsize=SESSION_MAX_ACTIVE)
+    if redis is None:
+        logger.warning("REDIS_URL is set but the redis package is not installed; "
+                       "using in-memory sessions")
+        return MemorySessionStore(ttl_seconds, maxsize=SESSION_MAX_ACTIVE)
+    pool = redis.ConnectionPool.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS)
+    client = redis.Redis(connection_pool=pool)
+    try:
+        client.ping()
+    except Exception as e:
+        logger.warning("Redis unavailable (%s); using in-memory sessions", e)
+        return MemorySessionStore(ttl_seconds, maxsize=SESSION_MAX_ACTIVE)
+    print("[init] Using Redis session store")
+    return RedisSessionStore(client, ttl_seconds=ttl_seconds)
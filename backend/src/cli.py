@@ -3,21 +3,26 @@ Interactive CLI for the AICP Research Portal.
 Ask natural-language questions against the database with RBAC enforcement.
 """
 
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
-from src.config import MAX_PREVIEW_ROWS
-from src.database import init_engine, build_schema_summary
+from src.cache import TTLCache
+from src.config import MAX_PREVIEW_ROWS, CLI_MAX_ROWS, SQL_BATCH_SIZE, SQL_CACHE_SIZE, SQL_CACHE_TTL_SEC
+from src.database import init_engine, get_schema_cached, read_query_chunked
 from src.llm import init_llm
 from src.rbac import load_access_context, build_policy
-from src.sql_generator import generate_sql
-from src.analysis import compute_basic_analysis, compute_advanced_analysis, summarize_result
+from src.sql_generator import generate_sql, generate_sql_batch, apply_row_limit, has_row_limit
+from src.analysis import (
+    compute_basic_analysis, compute_advanced_analysis, stream_summary, quick_summary,
+    wants_advanced_analysis,
+)
 
 
 def main():
     print("=== AICP Research Portal: NL → SQL Assistant (RBAC + Next-Level Analysis) ===\n")
 
-    engine = init_engine()
-    schema_text = build_schema_summary(engine)
+    # The session holds one connection; a second covers schema lookups.
+    engine = init_engine(pool_size=2, max_overflow=0)
+    schema_text = get_schema_cached(engine)
     llm = init_llm()
 
     # ── Login ────────────────────────────────────────────────────────
@@ -42,71 +47,184 @@ def main():
     print(f"\n[auth] Logged in as: {ctx.display_name} (role={ctx.role})")
     print(f"[auth] Policy: {policy.notes}")
 
+    # One connection for the whole session; autocommit so read-only queries
+    # don't leave a transaction open between questions.
+    conn = _open_session_connection(engine)
+    # Re-asked questions (same wording up to case/spacing) reuse their SQL.
+    sql_cache = TTLCache(maxsize=SQL_CACHE_SIZE, ttl_seconds=SQL_CACHE_TTL_SEC)
+
     # ── REPL ─────────────────────────────────────────────────────────
-    while True:
+    try:
+        while True:
+            try:
+                q = input("\nAsk a question about the database ('batch' for several, or 'quit'): ").strip()
+            except (EOFError, KeyboardInterrupt):
+                print("\nExiting.")
+                break
+
+            if not q:
+                continue
+            if q.lower() in {"quit", "exit"}:
+                print("Goodbye.")
+                break
+            if q.lower() == "batch":
+                conn = _run_batch(engine, conn, llm, schema_text, policy, sql_cache)
+                continue
+
+            print(f"\n[user] {q}")
+
+            # 1) Generate SQL
+            try:
+                sql = generate_sql(llm, schema_text, policy, q, cache=sql_cache)
+            except Exception as e:
+                print("\n[RBAC/SQL ERROR] Could not generate an allowed SQL query.")
+                print("Details:", e)
+                continue
+
+            conn = _answer(engine, conn, llm, q, sql)
+    finally:
+        conn.close()
+
+
+def _run_batch(engine, conn, llm, schema_text, policy, sql_cache):
+    """Collect up to SQL_BATCH_SIZE questions, generate their SQL in one LLM
+    request, then answer them in order. Returns the (possibly reopened) connection."""
+    print(f"[batch] Enter up to {SQL_BATCH_SIZE} questions, one per line; blank line to run.")
+    questions = []
+    while len(questions) < SQL_BATCH_SIZE:
         try:
-            q = input("\nAsk a question about the database (or 'quit'): ").strip()
+            line = input(f"  {len(questions) + 1}> ").strip()
         except (EOFError, KeyboardInterrupt):
-            print("\nExiting.")
             break
-
-        if not q:
-            continue
-        if q.lower() in {"quit", "exit"}:
-            print("Goodbye.")
+        if not line:
             break
+        questions.append(line)
+    if not questions:
+        return conn
 
-        print(f"\n[user] {q}")
-
-        # 1) Generate SQL
-        try:
-            sql = generate_sql(llm, schema_text, policy, q)
-        except Exception as e:
-            print("\n[RBAC/SQL ERROR] Could not generate an allowed SQL query.")
-            print("Details:", e)
-            continue
-
-        print("\n[SQL generated]")
-        print(sql)
+    try:
+        results = generate_sql_batch(llm, schema_text, policy, questions, cache=sql_cache)
+    except Exception as e:
+        print("\n[RBAC/SQL ERROR] Could not generate SQL for the batch.")
+        print("Details:", e)
+        return conn
+
+    # While one answer is analysed and summarised (LLM-bound), the worker
+    # already runs the next query (DB-bound). Only the worker uses conn
+    # until the batch is done; it is reopened between fetches if lost.
+    runnable = [i for i, sql in enumerate(results) if not isinstance(sql, Exception)]
+    following = dict(zip(runnable, runnable[1:]))
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        fetches = {}
+        if runnable:
+            fetches[runnable[0]] = pool.submit(_fetch, conn, results[runnable[0]])
+        for i, (q, sql) in enumerate(zip(questions, results)):
+            print(f"\n[user] {q}")
+            if isinstance(sql, Exception):
+                print("\n[RBAC/SQL ERROR] Could not generate an allowed SQL query.")
+                print("Details:", sql)
+                continue
+            print("\n[SQL generated]")
+            print(sql)
+            try:
+                fetched, error = fetches.pop(i).result(), None
+            except Exception as e:
+                fetched, error = None, e
+                conn = _db_error(engine, conn, e)
+            if i in following:
+                fetches[following[i]] = pool.submit(_fetch, conn, results[following[i]])
+            if error is None:
+                _report(llm, q, sql, *fetched)
+    return conn
+
+
+def _answer(engine, conn, llm, q, sql):
+    """Run *sql* for question *q* and print the results and analyses.
+
+    Returns the connection to keep using, which is a new one if the old one
+    was lost.
+    """
+    print("\n[SQL generated]")
+    print(sql)
+
+    # 2) Execute
+    try:
+        df, truncated = _fetch(conn, sql)
+    except Exception as e:
+        return _db_error(engine, conn, e)
+    _report(llm, q, sql, df, truncated)
+    return conn
+
+
+def _fetch(conn, sql):
+    """(rows, truncated) for *sql*, reading at most CLI_MAX_ROWS rows."""
+    # One row past the cap tells us whether anything was left unread. The cap
+    # goes into the SQL too, so the server stops there and a TOP-bounded query
+    # may take the connectorx path.
+    bounded_sql = apply_row_limit(sql, CLI_MAX_ROWS + 1)
+    df = read_query_chunked(
+        conn, bounded_sql, max_rows=CLI_MAX_ROWS + 1, server_bounded=has_row_limit(bounded_sql)
+    )
+    truncated = len(df) > CLI_MAX_ROWS
+    return (df.head(CLI_MAX_ROWS) if truncated else df), truncated
+
+
+def _db_error(engine, conn, e):
+    """Report a failed query; returns *conn*, or a fresh one if it was lost."""
+    print("\n[DB ERROR] Database error while running the query.")
+    print("Details:", e)
+    if conn.invalidated or conn.closed:
+        conn.close()
+        conn = _open_session_connection(engine)
+    return conn
+
+
+def _report(llm, q, sql, df, truncated):
+    """Print the preview and the basic, advanced and AI analyses of *df*."""
+    # 3) Preview
+    print("\n[Preview of results (up to 20 rows)]")
+    if df.empty:
+        print("(no rows returned)")
+    else:
+        print(df.head(MAX_PREVIEW_ROWS).to_string(index=False))
+    if truncated:
+        print(f"... (truncated: only the first {CLI_MAX_ROWS} rows were read and analysed)")
+
+    # 4) Basic analysis
+    numeric_summary, cat_summary = compute_basic_analysis(df)
+    print("\n[Basic numeric summary]")
+    print(numeric_summary)
+    print("\n[Basic categorical summary]")
+    print(cat_summary)
+
+    # 5) Advanced analysis (skipped for tiny results)
+    if wants_advanced_analysis(df):
+        advanced_summary = compute_advanced_analysis(df)
+    else:
+        advanced_summary = "No advanced analysis: result is too small."
+    print("\n[Advanced analysis (automatic)]")
+    print(advanced_summary)
 
-        # 2) Execute
-        try:
-            with engine.connect() as conn:
-                df = pd.read_sql_query(sql, conn)
-        except Exception as e:
-            print("\n[DB ERROR] Database error while running the query.")
-            print("Details:", e)
-            continue
-
-        # 3) Preview
-        print("\n[Preview of results (up to 20 rows)]")
-        if df.empty:
-            print("(no rows returned)")
+    # 6) AI narrative (answered locally for tiny results), streamed
+    #    so it starts printing as soon as the model starts answering
+    try:
+        summary = quick_summary(df)
+        print("\n[AI Analysis]")
+        if summary is not None:
+            print(summary)
         else:
-            print(df.head(MAX_PREVIEW_ROWS).to_string(index=False))
-
-        # 4) Basic analysis
-        numeric_summary, cat_summary = compute_basic_analysis(df)
-        print("\n[Basic numeric summary]")
-        print(numeric_summary)
-        print("\n[Basic categorical summary]")
-        print(cat_summary)
+            for piece in stream_summary(
+                llm, q, sql, df, numeric_summary, cat_summary, advanced_summary
+            ):
+                print(piece, end="", flush=True)
+            print()
+    except Exception as e:
+        print("\n[WARN] Failed to generate AI analysis; showing only raw data.")
+        print("Details:", e)
 
-        # 5) Advanced analysis
-        advanced_summary = compute_advanced_analysis(df)
-        print("\n[Advanced analysis (automatic)]")
-        print(advanced_summary)
 
-        # 6) AI narrative
-        try:
-            summary = summarize_result(
-                llm, q, sql, df, numeric_summary, cat_summary, advanced_summary
-            )
-            print("\n[AI Analysis]")
-            print(summary)
-        except Exception as e:
-            print("\n[WARN] Failed to generate AI analysis; showing only raw data.")
-            print("Details:", e)
+def _open_session_connection(engine):
+    return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
 
 
 if __name__ == "__main__":
@@ -2,18 +2,50 @@
 Database engine initialisation and schema introspection.
 """
 
+import hashlib
+import json
+import os
 import sys
-from typing import List
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy import create_engine, inspect, text
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import ProgrammingError
 
-from src.config import get_env, MAX_SCHEMA_CHARS
+from src.config import (
+    get_env, MAX_SCHEMA_CHARS, SCHEMA_VERSION_CHECK_SEC, SCHEMA_CACHE_DIR,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    CONNECTORX_URI, QUERY_CHUNK_ROWS, SQL_PREFLIGHT,
+)
+from src.log import get_logger
 
+try:
+    import connectorx as cx
+except ImportError:  # optional: only used when CONNECTORX_URI is set
+    cx = None
 
-def init_engine():
-    """Create a SQLAlchemy engine and verify the connection."""
+logger = get_logger("database")
+
+
+def init_engine(pool_size: Optional[int] = None, max_overflow: Optional[int] = None):
+    """Create a pooled SQLAlchemy engine and verify the connection.
+
+    Pool sizing defaults to DB_POOL_SIZE / DB_MAX_OVERFLOW; pass explicit
+    values for a secondary engine that should stay small.
+    """
     db_uri = get_env("DB_URI")
-    engine = create_engine(db_uri, echo=False, future=True)
+    engine = create_engine(
+        db_uri,
+        echo=False,
+        future=True,
+        pool_size=DB_POOL_SIZE if pool_size is None else pool_size,
+        max_overflow=DB_MAX_OVERFLOW if max_overflow is None else max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
     try:
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
@@ -21,19 +53,261 @@ def init_engine():
         print("ERROR: could not connect to DB:", e, file=sys.stderr)
         sys.exit(1)
     print("[init] Connected to DB.")
+    if hasattr(os, "register_at_fork"):
+        # Under a pre-forking server (gunicorn --preload) each worker must not
+        # reuse the parent's pooled sockets: drop them, unclosed, in the child.
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
     return engine
 
 
-def build_schema_summary(engine) -> str:
-    """Describe dbo tables/columns for the LLM, truncated to MAX_SCHEMA_CHARS."""
-    insp = inspect(engine)
-    tables: List[str] = insp.get_table_names(schema="dbo")
-    lines = []
-    for t in sorted(tables):
-        cols = insp.get_columns(t, schema="dbo")
-        col_desc = ", ".join(f"{c['name']} {str(c['type'])}" for c in cols)
-        lines.append(f"Table dbo.{t}({col_desc})")
-    schema_text = "\n".join(lines)
+def read_query_frame(engine, sql: str, max_rows: int, server_bounded: bool = False) -> pd.DataFrame:
+    """Run *sql* and return at most *max_rows* rows.
+
+    If the query is already capped server-side (*server_bounded*) and
+    CONNECTORX_URI is configured, it is read through connectorx's Arrow path.
+    Otherwise, or if that fails, pandas reads through the SQLAlchemy pool and
+    stops after the first *max_rows* chunk. The query is checked with
+    preflight_sql() first either way.
+    """
+    with engine.connect() as conn:
+        preflight_sql(conn, sql)
+        if server_bounded:
+            df = _read_arrow(sql)
+            if df is not None:
+                return df.head(max_rows)
+        # pyodbc has no server-side cursors, so the bound is the TOP from
+        # apply_row_limit. Closing after one fetchmany() just releases the
+        # cursor before the rest of an uncapped result is turned into rows.
+        batches = pd.read_sql_query(sql, conn, chunksize=max_rows)
+        try:
+            return next(batches)
+        finally:
+            batches.close()
+
+
+_DESCRIBE_SQL = text("EXEC sys.sp_describe_first_result_set @tsql = :tsql")
+
+
+def preflight_sql(conn, sql: str) -> None:
+    """Have SQL Server parse *sql* without running it; raise ValueError unless
+    it compiles to a statement that returns a result set.
+
+    sp_describe_first_result_set rejects anything the server cannot parse or
+    bind, and describes no columns for DML/DDL, so this backs up the regex
+    checks in sql_generator with the server's own parser. Only parse/bind
+    errors (ProgrammingError) count as a rejection; connection and other
+    operational errors propagate unchanged. Skipped on other dialects or
+    when SQL_PREFLIGHT is off.
+    """
+    if not SQL_PREFLIGHT or conn.dialect.name != "mssql":
+        return
+    try:
+        columns = conn.execute(_DESCRIBE_SQL, {"tsql": sql}).fetchall()
+    except ProgrammingError as e:
+        raise ValueError(f"Query rejected by SQL Server preflight: {e.orig}") from e
+    if not columns:
+        raise ValueError("Query rejected by SQL Server preflight: it returns no result set.")
+
+
+def _read_arrow(sql: str) -> Optional[pd.DataFrame]:
+    """Columnar read through connectorx (Arrow batches, no per-cell Python
+    objects), or None when it is not configured or the read fails."""
+    if not CONNECTORX_URI or cx is None:
+        return None
+    try:
+        return cx.read_sql(CONNECTORX_URI, sql, return_type="arrow").to_pandas()
+    except Exception as e:
+        logger.warning("connectorx read failed, falling back to SQLAlchemy: %s", e)
+        return None
+
+
+def read_query_chunked(
+    conn,
+    sql: str,
+    chunksize: int = QUERY_CHUNK_ROWS,
+    max_rows: Optional[int] = None,
+    server_bounded: bool = False,
+) -> pd.DataFrame:
+    """Run *sql* on *conn* and return its rows, fetched *chunksize* rows at a time.
+
+    With *max_rows*, fetching stops as soon as that many rows have arrived
+    and the result is cut to it. Only a query already capped server-side
+    (*server_bounded*) may go through connectorx when CONNECTORX_URI is set,
+    since that path reads the whole result on its own connection. Otherwise
+    pandas pulls each batch with fetchmany() on *conn* and turns it into
+    columns as it arrives, so only one chunk of Python row tuples exists at
+    a time.
+    """
+    preflight_sql(conn, sql)
+    if server_bounded:
+        df = _read_arrow(sql)
+        if df is not None:
+            return df if max_rows is None else df.head(max_rows)
+    batches = pd.read_sql_query(sql, conn, chunksize=chunksize)
+    chunks, total = [], 0
+    try:
+        for chunk in batches:
+            chunks.append(chunk)
+            total += len(chunk)
+            if max_rows is not None and total >= max_rows:
+                break
+    finally:
+        batches.close()  # releases the cursor if we stopped early
+    if len(chunks) == 1:
+        df = chunks[0]
+    else:
+        df = pd.concat(chunks, ignore_index=True)
+    return df if max_rows is None or len(df) <= max_rows else df.head(max_rows)
+
+
+# One catalog round-trip for every dbo column, instead of an Inspector
+# get_columns() call per table.
+_SCHEMA_COLUMNS_SQL = text("""
+SELECT c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE, c.CHARACTER_MAXIMUM_LENGTH,
+       c.NUMERIC_PRECISION, c.NUMERIC_SCALE
+FROM INFORMATION_SCHEMA.COLUMNS c
+JOIN INFORMATION_SCHEMA.TABLES t
+  ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+WHERE c.TABLE_SCHEMA = 'dbo' AND t.TABLE_TYPE = 'BASE TABLE'
+ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+""")
+
+
+def _column_type(data_type: str, char_len, precision, scale) -> str:
+    data_type = data_type.upper()
+    if char_len is not None and data_type.endswith(("CHAR", "BINARY")):
+        return f"{data_type}({'max' if char_len == -1 else char_len})"
+    if data_type in ("DECIMAL", "NUMERIC"):
+        return f"{data_type}({precision}, {scale})"
+    return data_type
+
+
+def format_schema_summary(rows) -> str:
+    """Render (table, column, type, char_len, precision, scale) rows for the LLM.
+
+    If the typed listing would exceed MAX_SCHEMA_CHARS, every table is listed
+    with column names only rather than cutting tables off the end; only if
+    that still does not fit is the text truncated.
+    """
+    tables: Dict[str, List[Tuple[str, str]]] = {}
+    for table, column, data_type, char_len, precision, scale in rows:
+        tables.setdefault(table, []).append(
+            (column, _column_type(data_type, char_len, precision, scale))
+        )
+    names = sorted(tables)
+    schema_text = "\n".join(
+        f"Table dbo.{t}({', '.join(f'{c} {typ}' for c, typ in tables[t])})" for t in names
+    )
+    if len(schema_text) <= MAX_SCHEMA_CHARS:
+        return schema_text
+    schema_text = "\n".join(
+        f"Table dbo.{t}({', '.join(c for c, _ in tables[t])})" for t in names
+    ) + "\n(column types omitted for length)"
     if len(schema_text) > MAX_SCHEMA_CHARS:
         schema_text = schema_text[:MAX_SCHEMA_CHARS] + "\n... (schema truncated)"
     return schema_text
+
+
+def build_schema_summary(engine) -> str:
+    """Describe dbo tables/columns for the LLM, truncated to MAX_SCHEMA_CHARS."""
+    with engine.connect() as conn:
+        rows = conn.execute(_SCHEMA_COLUMNS_SQL).all()
+    return format_schema_summary(rows)
+
+
+# ── Version-keyed schema cache ───────────────────────────────────────
+
+# Table count + latest modify_date moves whenever a dbo table is created,
+# dropped or altered, and costs one catalog lookup instead of a reflection.
+_SCHEMA_VERSION_SQL = text(
+    "SELECT COUNT(*), MAX(modify_date) FROM sys.tables WHERE schema_id = SCHEMA_ID('dbo')"
+)
+
+_schema_lock = threading.Lock()
+_schema_cache = {"version": None, "text": None, "checked_at": float("-inf")}
+
+
+def schema_version(engine) -> Tuple:
+    """Cheap fingerprint of the dbo schema."""
+    with engine.connect() as conn:
+        return tuple(conn.execute(_SCHEMA_VERSION_SQL).one())
+
+
+def _schema_cache_file(engine) -> Optional[str]:
+    if not SCHEMA_CACHE_DIR:
+        return None
+    db_key = hashlib.sha256(
+        engine.url.render_as_string(hide_password=True).encode("utf-8")
+    ).hexdigest()[:16]
+    return os.path.join(SCHEMA_CACHE_DIR, f"schema_{db_key}.json")
+
+
+def _load_schema_file(engine, version: Tuple) -> Optional[str]:
+    """Summary saved by an earlier run, if it was built for this *version*."""
+    path = _schema_cache_file(engine)
+    if not path:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if saved.get("version") != repr(version):
+        return None
+    return saved.get("text")
+
+
+def _save_schema_file(engine, version: Tuple, schema_text: str) -> None:
+    path = _schema_cache_file(engine)
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": repr(version), "text": schema_text}, f)
+        os.replace(tmp, path)  # atomic, so concurrent workers never read half a file
+    except OSError as e:
+        logger.warning("Could not write schema cache %s: %s", path, e)
+
+
+def get_schema_cached(engine) -> str:
+    """Return the schema summary, rebuilding it only when schema_version moves.
+
+    The version itself is re-read at most every SCHEMA_VERSION_CHECK_SEC; if
+    that lookup fails the last good summary keeps being served. Summaries are
+    also saved under SCHEMA_CACHE_DIR, so a fresh process whose schema
+    version matches skips introspection altogether.
+    """
+    with _schema_lock:
+        now = time.monotonic()
+        if (
+            _schema_cache["text"] is not None
+            and now - _schema_cache["checked_at"] < SCHEMA_VERSION_CHECK_SEC
+        ):
+            return _schema_cache["text"]
+        try:
+            version = schema_version(engine)
+        except Exception as e:
+            if _schema_cache["text"] is None:
+                raise
+            logger.warning("Schema version check failed: %s", e)
+            _schema_cache["checked_at"] = now
+            return _schema_cache["text"]
+        if version != _schema_cache["version"] or _schema_cache["text"] is None:
+            if _schema_cache["text"] is not None:
+                logger.info("dbo schema changed; rebuilding summary")
+            schema_text = _load_schema_file(engine, version)
+            source = "cache file"
+            if schema_text is None:
+                schema_text = build_schema_summary(engine)
+                _save_schema_file(engine, version, schema_text)
+                source = "catalog"
+            # The summary is the bulk of every SQL prompt's cached prefix;
+            # its digest shows when (and why) that prefix last changed.
+            digest = hashlib.sha256(schema_text.encode("utf-8")).hexdigest()[:12]
+            logger.info("Schema summary from %s: %d chars, sha256=%s", source, len(schema_text), digest)
+            _schema_cache["text"] = schema_text
+            _schema_cache["version"] = version
+        _schema_cache["checked_at"] = now
+        return _schema_cache["text"]
@@ -2,14 +2,141 @@
 LLM (Large Language Model) initialisation.
 """
 
+import hashlib
+import threading
+from typing import Optional, Sequence, Tuple
+
 from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+
+from src.cache import TTLCache
+from src.config import (
+    get_env, MODEL_NAME, LLM_CACHE_SIZE, LLM_CACHE_TTL_SEC, PROMPT_CACHE_ALERT_RATIO,
+    PROMPT_CACHE_KEY,
+)
+from src.log import get_logger
+
+logger = get_logger("llm")
+
+
+def prompt_key(model: str, messages: Sequence[BaseMessage]) -> str:
+    """Stable digest of a chat prompt (model, roles and contents)."""
+    h = hashlib.sha256(model.encode("utf-8"))
+    for m in messages:
+        h.update(b"\0" + m.type.encode("utf-8") + b"\0" + str(m.content).encode("utf-8"))
+    return h.hexdigest()
+
+
+class CachedLLM:
+    """Chat model wrapper that answers repeated identical prompts from a cache.
+
+    Only ``invoke`` and ``stream`` are intercepted; every other attribute is the wrapped
+    model's, so callers can treat this as the model itself.
+    """
+
+    def __init__(self, llm, cache: TTLCache, model: str = MODEL_NAME):
+        self._llm = llm
+        self._cache = cache
+        self._model = model
+
+    def invoke(self, messages, *args, **kwargs):
+        key = prompt_key(self._model, messages)
+        resp = self._cache.get(key)
+        if resp is None:
+            resp = self._llm.invoke(messages, *args, **kwargs)
+            self._cache.set(key, resp)
+        return resp
+
+    def stream(self, messages, *args, **kwargs):
+        key = prompt_key(self._model, messages)
+        resp = self._cache.get(key)
+        if resp is not None:
+            yield resp
+            return
+        full = None
+        for chunk in self._llm.stream(messages, *args, **kwargs):
+            full = chunk if full is None else full + chunk
+            yield chunk
+        if full is not None:
+            self._cache.set(key, full)
+
+    def __getattr__(self, name):
+        return getattr(self._llm, name)
+
+
+def prompt_token_usage(message) -> Optional[Tuple[int, int]]:
+    """(prompt_tokens, cached_tokens) reported for a chat response, if any."""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        details = usage.get("input_token_details") or {}
+        return usage.get("input_tokens", 0), details.get("cache_read", 0)
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage")
+    if token_usage:
+        details = token_usage.get("prompt_tokens_details") or {}
+        return token_usage.get("prompt_tokens", 0), details.get("cached_tokens", 0)
+    return None
+
+
+class PromptCacheMonitor(BaseCallbackHandler):
+    """Tracks how much of each prompt OpenAI served from its prefix cache.
+
+    Keeps a moving average of cached/prompt tokens and warns once when it
+    falls below *alert_ratio*, which usually means something per-request
+    (a timestamp, a user id, the schema) has crept into the static prefix.
+    Prompts shorter than OpenAI's caching minimum are ignored.
+    """
+
+    MIN_CACHEABLE_TOKENS = 1024
+
+    def __init__(self, alert_ratio: float = PROMPT_CACHE_ALERT_RATIO, smoothing: float = 0.1,
+                 warmup: int = 5):
+        self.alert_ratio = alert_ratio
+        self.smoothing = smoothing
+        self.warmup = warmup
+        self.ratio: Optional[float] = None
+        self.samples = 0
+        self._alerted = False
+        self._lock = threading.Lock()
+
+    def record(self, prompt_tokens: int, cached_tokens: int) -> None:
+        if prompt_tokens < self.MIN_CACHEABLE_TOKENS:
+            return
+        hit = cached_tokens / prompt_tokens
+        with self._lock:
+            self.samples += 1
+            self.ratio = hit if self.ratio is None else self.ratio + self.smoothing * (hit - self.ratio)
+            ratio, samples = self.ratio, self.samples
+            alert = samples >= self.warmup and ratio < self.alert_ratio and not self._alerted
+            if alert:
+                self._alerted = True
+            elif ratio >= self.alert_ratio:
+                self._alerted = False
+        logger.debug("prompt_tokens=%d cached_tokens=%d cache_hit_ratio=%.2f",
+                     prompt_tokens, cached_tokens, ratio)
+        if alert:
+            logger.warning("Prompt cache hit ratio dropped to %.2f over %d calls; check the "
+                           "system prompt for per-request content", ratio, samples)
 
-from src.config import get_env, MODEL_NAME
+    def on_llm_end(self, response, **kwargs) -> None:
+        for generations in response.generations:
+            for gen in generations:
+                usage = prompt_token_usage(getattr(gen, "message", None))
+                if usage:
+                    self.record(*usage)
 
 
-def init_llm() -> ChatOpenAI:
-    """Initialise and return the ChatOpenAI instance."""
+def init_llm():
+    """Initialise and return the ChatOpenAI instance (response-cached unless LLM_CACHE_SIZE=0)."""
     _ = get_env("OPENAI_API_KEY")  # fail early if missing
-    llm = ChatOpenAI(model=MODEL_NAME, temperature=0)
+    llm = ChatOpenAI(
+        model=MODEL_NAME,
+        temperature=0,
+        stream_usage=True,  # so streamed summaries report token usage too
+        callbacks=[PromptCacheMonitor()],
+        model_kwargs={"prompt_cache_key": PROMPT_CACHE_KEY} if PROMPT_CACHE_KEY else {},
+    )
     print(f"[init] Using LLM model: {MODEL_NAME}")
+    if LLM_CACHE_SIZE > 0:
+        return CachedLLM(llm, TTLCache(maxsize=LLM_CACHE_SIZE, ttl_seconds=LLM_CACHE_TTL_SEC))
     return llm
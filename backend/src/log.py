@@ -0,0 +1,61 @@
+"""
+Non-blocking logging for the API.
+
+Request threads only put records on a queue; one listener thread does the
+actual write to stderr, so an error storm no longer serialises the workers
+on stderr's lock.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+from src.config import LOG_LEVEL
+
+_listener = None
+_lock = threading.Lock()
+
+
+def _start_listener() -> None:
+    global _listener
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter("[%(levelname)s] %(name)s: %(message)s"))
+
+    root = logging.getLogger("aicp")
+    root.setLevel(LOG_LEVEL)
+    root.handlers = [logging.handlers.QueueHandler(records)]
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_in_child() -> None:
+    # The listener thread does not survive fork; give each worker its own.
+    if _listener is not None:
+        _start_listener()
+
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()  # flush whatever is still queued
+
+
+atexit.register(_stop_listener)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the ``aicp`` hierarchy, starting the queue listener on first use."""
+    if _listener is None:
+        with _lock:
+            if _listener is None:
+                _start_listener()
+    return logging.getLogger(f"aicp.{name}")
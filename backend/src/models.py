@@ -3,7 +3,7 @@ Domain dataclasses used across the application.
 """
 
 from dataclasses import dataclass
-from typing import Optional, Set
+from typing import AbstractSet, Optional
 
 
 @dataclass
@@ -23,5 +23,7 @@ class Policy:
     scope_filter_hint: str
     required_filter_column: Optional[str]
     required_filter_value: Optional[int]
-    blocked_patient_columns: Set[str]
+    blocked_patient_columns: AbstractSet[str]
     notes: str
+    # Policy part of the generate_sql prompt, rendered once by build_policy.
+    prompt_context: str = ""
@@ -2,21 +2,27 @@
 Role-Based Access Control – loading user context and building policies.
 """
 
+from typing import Callable, Dict, FrozenSet
+
 from sqlalchemy import text
 
 from src.config import SENSITIVE_PATIENT_COLUMNS
 from src.models import AccessContext, Policy
+from src.sql_generator import render_policy_context
+
+
+# Built once: the statement text (and so the driver's cached plan) is the same every login.
+_ACCESS_CONTEXT_SQL = text("""
+    SELECT TOP 1 id, display_name, role, doctor_id, pharmacy_id
+    FROM dbo.portal_users
+    WHERE api_key = :k AND is_active = 1
+""")
 
 
 def load_access_context(engine, api_key: str) -> AccessContext:
     """Look up a user by API key and return their AccessContext."""
-    sql = text("""
-        SELECT TOP 1 id, display_name, role, doctor_id, pharmacy_id
-        FROM dbo.portal_users
-        WHERE api_key = :k AND is_active = 1
-    """)
     with engine.connect() as conn:
-        row = conn.execute(sql, {"k": api_key}).mappings().first()
+        row = conn.execute(_ACCESS_CONTEXT_SQL, {"k": api_key}).mappings().first()
 
     if not row:
         raise ValueError("Invalid key or user inactive (no match in dbo.portal_users).")
@@ -34,51 +40,73 @@ def load_access_context(engine, api_key: str) -> AccessContext:
     )
 
 
+# Blocklists are shared frozensets (SENSITIVE_PATIENT_COLUMNS is one too):
+# sql_generator's frozenset() of them is then a no-op and its pattern caches
+# hash the same object every query.
+_NO_BLOCKED_COLUMNS: FrozenSet[str] = frozenset()
+
+
+def _with_prompt_context(policy: Policy) -> Policy:
+    policy.prompt_context = render_policy_context(policy.role, policy.scope_filter_hint)
+    return policy
+
+
+def _doctor_policy(ctx: AccessContext) -> Policy:
+    if ctx.doctor_id is None:
+        raise ValueError("Doctor user must have doctor_id set in dbo.portal_users.")
+    return _with_prompt_context(Policy(
+        role="doctor",
+        scope_filter_hint=(
+            f"Row-level rule: Only include patients where dbo.patients.family_dr_id = {ctx.doctor_id}.\n"
+            "If querying other tables with patient_id, JOIN to dbo.patients and apply that filter."
+        ),
+        required_filter_column="family_dr_id",
+        required_filter_value=ctx.doctor_id,
+        blocked_patient_columns=_NO_BLOCKED_COLUMNS,
+        notes="Doctor can access patient-level data, but only within their family_dr_id scope.",
+    ))
+
+
+def _pharmacy_policy(ctx: AccessContext) -> Policy:
+    if ctx.pharmacy_id is None:
+        raise ValueError("Pharmacy user must have pharmacy_id set in dbo.portal_users.")
+    return _with_prompt_context(Policy(
+        role="pharmacy",
+        scope_filter_hint=(
+            f"Row-level rule: Only include patients where dbo.patients.pharmacy_id = {ctx.pharmacy_id}.\n"
+            "If querying other tables with patient_id, JOIN to dbo.patients and apply that filter.\n"
+            "Column-level rule: Do NOT select patient PII (names, address, phones, email, health card, birth date)."
+        ),
+        required_filter_column="pharmacy_id",
+        required_filter_value=ctx.pharmacy_id,
+        blocked_patient_columns=SENSITIVE_PATIENT_COLUMNS,
+        notes="Pharmacy should primarily analyze clinical/utilization info. Patient PII is blocked.",
+    ))
+
+
+# Admin policies don't depend on the user, so every admin session shares one.
+_ADMIN_POLICY = _with_prompt_context(Policy(
+    role="admin",
+    scope_filter_hint=(
+        "Admin rule: Full access to all tables and rows. "
+        "No row-level scope filters required."
+    ),
+    required_filter_column=None,
+    required_filter_value=None,
+    blocked_patient_columns=_NO_BLOCKED_COLUMNS,
+    notes="Admin can access all data (including patient-level and PII).",
+))
+
+_POLICY_BUILDERS: Dict[str, Callable[[AccessContext], Policy]] = {
+    "doctor": _doctor_policy,
+    "pharmacy": _pharmacy_policy,
+    "admin": lambda ctx: _ADMIN_POLICY,
+}
+
+
 def build_policy(ctx: AccessContext) -> Policy:
-    """Derive an RBAC Policy from an AccessContext."""
-
-    if ctx.role == "doctor":
-        if ctx.doctor_id is None:
-            raise ValueError("Doctor user must have doctor_id set in dbo.portal_users.")
-        return Policy(
-            role="doctor",
-            scope_filter_hint=(
-                f"Row-level rule: Only include patients where dbo.patients.family_dr_id = {ctx.doctor_id}.\n"
-                "If querying other tables with patient_id, JOIN to dbo.patients and apply that filter."
-            ),
-            required_filter_column="family_dr_id",
-            required_filter_value=ctx.doctor_id,
-            blocked_patient_columns=set(),
-            notes="Doctor can access patient-level data, but only within their family_dr_id scope.",
-        )
-
-    if ctx.role == "pharmacy":
-        if ctx.pharmacy_id is None:
-            raise ValueError("Pharmacy user must have pharmacy_id set in dbo.portal_users.")
-        return Policy(
-            role="pharmacy",
-            scope_filter_hint=(
-                f"Row-level rule: Only include patients where dbo.patients.pharmacy_id = {ctx.pharmacy_id}.\n"
-                "If querying other tables with patient_id, JOIN to dbo.patients and apply that filter.\n"
-                "Column-level rule: Do NOT select patient PII (names, address, phones, email, health card, birth date)."
-            ),
-            required_filter_column="pharmacy_id",
-            required_filter_value=ctx.pharmacy_id,
-            blocked_patient_columns=set(SENSITIVE_PATIENT_COLUMNS),
-            notes="Pharmacy should primarily analyze clinical/utilization info. Patient PII is blocked.",
-        )
-
-    if ctx.role == "admin":
-        return Policy(
-            role="admin",
-            scope_filter_hint=(
-                "Admin rule: Full access to all tables and rows. "
-                "No row-level scope filters required."
-            ),
-            required_filter_column=None,
-            required_filter_value=None,
-            blocked_patient_columns=set(),
-            notes="Admin can access all data (including patient-level and PII).",
-        )
-
-    raise ValueError(f"Unknown role: {ctx.role}")
+    """Derive an RBAC Policy from an AccessContext, with its prompt context rendered."""
+    builder = _POLICY_BUILDERS.get(ctx.role)
+    if builder is None:
+        raise ValueError(f"Unknown role: {ctx.role}")
+    return builder(ctx)
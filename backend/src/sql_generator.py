@@ -2,22 +2,34 @@
 SQL generation from natural language, with safety checks and RBAC enforcement.
 """
 
+import json
 import re
-from typing import Optional, Set
+from contextlib import closing
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple, Union
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from src.cache import TTLCache
 from src.config import PHARMACY_AGGREGATES_ONLY
 from src.models import Policy
 
 
 # ── Helper functions ─────────────────────────────────────────────────
 
+_DBO_TABLE_RE = re.compile(r"(?is)\b(?:from|join)\s+dbo\.([a-zA-Z0-9_]+)\b")
+_SELECT_RE = re.compile(r"(?is)^\s*select\b")
+
+
 def extract_dbo_tables(sql: str) -> Set[str]:
     """Return the set of dbo.* table names referenced in FROM / JOIN clauses."""
-    hits = re.findall(r"(?is)\b(?:from|join)\s+dbo\.([a-zA-Z0-9_]+)\b", sql)
-    return {h.lower() for h in hits}
+    return {h.lower() for h in _DBO_TABLE_RE.findall(sql)}
+
+
+@lru_cache(maxsize=256)
+def _scope_filter_pattern(filter_col: str, filter_val: int) -> "re.Pattern":
+    return re.compile(rf"(?is)\b{re.escape(filter_col.lower())}\b\s*=\s*{filter_val}\b")
 
 
 def contains_required_scope_filter(sql: str, filter_col: str, filter_val: int) -> bool:
@@ -25,98 +37,356 @@ def contains_required_scope_filter(sql: str, filter_col: str, filter_val: int) -
     s = sql.lower()
     if filter_col.lower() not in s:
         return False
-    if re.search(rf"(?is)\b{re.escape(filter_col.lower())}\b\s*=\s*{filter_val}\b", s):
+    if _scope_filter_pattern(filter_col, filter_val).search(s):
         return True
     return str(filter_val) in s
 
 
 def blocks_pii_for_pharmacy(sql: str, blocked_cols: Set[str]) -> Optional[str]:
     """Return the first blocked PII column found in the SQL, or None."""
-    s = sql.lower()
-    for col in blocked_cols:
-        if re.search(rf"(?is)\b{re.escape(col.lower())}\b", s):
-            return col
+    if not blocked_cols:
+        return None
+    return scan_sql(sql, blocked_cols).pii
+
+
+def strip_code_fence(sql: str) -> str:
+    """Remove a markdown code fence (``` or ```sql) around the LLM's answer."""
+    if not sql.startswith("```"):
+        return sql  # the usual case: the model followed "no markdown"
+    sql = sql.strip("`")
+    if sql[:3].lower() == "sql":
+        sql = sql[3:]
+    return sql.strip()
+
+
+class SqlScan(NamedTuple):
+    """What the safety and RBAC checks need to know about a query."""
+    tables: Set[str]           # dbo tables after FROM / JOIN (lower-case)
+    dangerous: Optional[str]   # first write/DDL verb, if any
+    pii: Optional[str]         # first blocked column, if any
+
+
+_SCAN_TABLE = r"\b(?:from|join)\s+dbo\.(?=(?P<table>[a-zA-Z0-9_]+)\b)"
+_SCAN_DANGER = r"\b(?P<danger>insert|update|delete|drop|alter|truncate|create|merge)\b"
+
+
+_DANGER_RE = re.compile("(?is)" + _SCAN_DANGER)
+_PARTIAL_WORD_RE = re.compile(r"\w*\Z")
+
+
+@lru_cache(maxsize=32)
+def _scan_pattern(blocked_cols: FrozenSet[str]) -> Tuple["re.Pattern", Dict[str, str]]:
+    by_lower = {c.lower(): c for c in blocked_cols}
+    alternatives = [_SCAN_TABLE, _SCAN_DANGER]
+    if by_lower:
+        names = "|".join(re.escape(c) for c in sorted(by_lower, key=len, reverse=True))
+        alternatives.append(rf"\b(?P<pii>{names})\b")
+    return re.compile("(?is)" + "|".join(alternatives)), by_lower
+
+
+def scan_sql(sql: str, blocked_cols: Set[str] = frozenset()) -> SqlScan:
+    """Collect tables, dangerous verbs and blocked columns in a single pass.
+
+    Equivalent to extract_dbo_tables, the dangerous-verb search and
+    blocks_pii_for_pharmacy run separately. The table alternative is a
+    lookahead, so a table name is still checked as a verb or column.
+    """
+    pattern, by_lower = _scan_pattern(frozenset(blocked_cols))
+    tables: Set[str] = set()
+    dangerous = pii = None
+    for m in pattern.finditer(sql):
+        kind = m.lastgroup
+        if kind == "table":
+            tables.add(m.group("table").lower())
+        elif kind == "danger":
+            dangerous = dangerous or m.group("danger").lower()
+        elif pii is None:
+            pii = by_lower[m.group("pii").lower()]
+    return SqlScan(tables, dangerous, pii)
+
+
+_SELECT_HEAD_RE = re.compile(r"(?is)^\s*select\s+(?:(?:distinct|all)\s+)?")
+_TOP_RE = re.compile(r"(?is)^top\b\s*(?:\(\s*(\d+)\s*\)|(\d+)\b)?(\s+percent\b)?")
+_NO_TOP_RE = re.compile(r"(?is)\b(?:union|except|intersect)\b|\boffset\s+\S+\s+rows?\b")
+
+
+def apply_row_limit(sql: str, limit: int) -> str:
+    """Cap a SELECT at *limit* rows server-side with T-SQL TOP.
+
+    Adds ``TOP (limit)`` after SELECT [DISTINCT], or lowers an existing
+    literal TOP that is larger. Queries where a leading TOP would be wrong
+    or ambiguous (set operators, OFFSET/FETCH, TOP PERCENT or a non-literal
+    TOP) are returned unchanged.
+    """
+    head = _SELECT_HEAD_RE.match(sql)
+    if not head or _NO_TOP_RE.search(sql):
+        return sql
+    rest = sql[head.end():]
+    top = _TOP_RE.match(rest)
+    if top is None:
+        return f"{sql[:head.end()]}TOP ({limit}) {rest}"
+    n = top.group(1) or top.group(2)
+    if n is None or top.group(3) or int(n) <= limit:
+        return sql
+    return f"{sql[:head.end()]}TOP ({limit}){rest[top.end():]}"
+
+
+def has_row_limit(sql: str) -> bool:
+    """True if the query's outer SELECT carries a literal, non-PERCENT TOP."""
+    head = _SELECT_HEAD_RE.match(sql)
+    if not head or _NO_TOP_RE.search(sql):
+        return False
+    top = _TOP_RE.match(sql[head.end():])
+    return bool(top and (top.group(1) or top.group(2)) and not top.group(3))
+
+
+# ── Validation ───────────────────────────────────────────────────────
+
+@lru_cache(maxsize=1024)
+def _validation_error(
+    sql: str,
+    role: str,
+    filter_col: Optional[str],
+    filter_val: Optional[int],
+    blocked_cols: FrozenSet[str],
+) -> Optional[str]:
+    """Run the safety and RBAC checks on whitespace-normalised *sql*.
+
+    Returns the reason the query is blocked, or None if it may run. Memoised
+    on the query text and the policy fields, so a retried or repeated query
+    is not re-scanned.
+    """
+    # ── Safety checks ────────────────────────────────────────────────
+    if not _SELECT_RE.match(sql):
+        return f"LLM generated non-SELECT query, blocked: {sql[:160]}..."
+    scan = scan_sql(sql, blocked_cols)
+    if scan.dangerous:
+        return f"LLM generated potentially unsafe query, blocked: {sql[:160]}..."
+
+    # ── RBAC enforcement ─────────────────────────────────────────────
+    if "patients" in scan.tables and filter_col and filter_val is not None:
+        if not contains_required_scope_filter(sql, filter_col, filter_val):
+            return (
+                f"RBAC block: query references dbo.patients but missing required scope filter "
+                f"{filter_col} = {filter_val}."
+            )
+
+    if role == "pharmacy":
+        if scan.pii:
+            return f"RBAC block: pharmacy role query attempted to use PII column '{scan.pii}'."
+        if PHARMACY_AGGREGATES_ONLY:
+            pass  # optionally block patient_id selection here
     return None
 
 
 # ── Main generation function ─────────────────────────────────────────
 
-def generate_sql(llm: ChatOpenAI, schema_text: str, policy: Policy, question: str) -> str:
-    """Ask the LLM to produce a safe, RBAC-compliant SQL SELECT query."""
+def sql_cache_key(schema_text: str, policy: Policy, question: str) -> tuple:
+    """Cache key for a question: same scope, same schema, same wording.
 
-    system = SystemMessage(
-        content=(
-            "You are an expert SQL assistant for a SQL Server (T-SQL) database.\n"
-            "You have READ-ONLY access.\n\n"
-            "CRITICAL SAFETY RULES:\n"
-            "- Output exactly ONE SQL SELECT query.\n"
-            "- Allowed clauses: SELECT, FROM, JOIN, WHERE, GROUP BY, ORDER BY, TOP.\n"
-            "- Never use INSERT/UPDATE/DELETE/DROP/ALTER/TRUNCATE/CREATE/MERGE.\n"
-            "- Always use explicit dbo.<table> names.\n"
-            "- ONLY use columns that exist in the provided schema. NEVER invent or assume column names.\n"
-            "- If a column does not exist in the schema, you CANNOT use it in your query.\n\n"
-            "PATIENT COUNT RULE:\n"
-            "- When counting or identifying patients, ALWAYS use dbo.patients as the primary table.\n"
-            "- Do NOT infer total patients from patient_notes, walkin_cases, or other auxiliary tables.\n\n"
-            "DATA EXTRACTION RULES:\n"
-            "- For diagnosis information: Search within the 'note' column of dbo.patient_notes using LIKE or string functions.\n"
-            "- For unstructured data: Use WHERE note LIKE '%keyword%' or string analysis functions.\n"
-            "- Do NOT assume structured columns exist if they are not in the schema.\n\n"
-            f"ROLE-BASED ACCESS POLICY:\n{policy.scope_filter_hint}\n\n"
-            "If the user asks something outside their permission, do NOT try to bypass it.\n"
-            "Instead, write a query that returns an allowed aggregate or allowed subset.\n"
-            "Return ONLY the SQL query, with no explanation and no markdown."
-        )
+    Only whitespace is normalised. Case is kept, since a quoted literal such
+    as a surname or code may only match in its own case under the database
+    collation.
+    """
+    return (
+        policy.role,
+        policy.required_filter_column,
+        policy.required_filter_value,
+        hash(schema_text),
+        " ".join(question.split()),
     )
 
-    role_hint = ""
-    if policy.role == "pharmacy":
-        role_hint = (
-            "\nExtra guidance for pharmacy role:\n"
-            "- Prefer aggregated outputs (counts, totals, distributions) over listing patient rows.\n"
-            "- Avoid selecting any patient identity or contact information.\n"
-        )
+
+# Static instructions only: the prompt prefix is byte-identical for every
+# user and question, so the provider's automatic prompt caching can reuse it.
+# Everything that varies (schema, access policy, question) goes in the
+# human message, most stable part first.
+_SQL_RULES = (
+    "You are an expert SQL assistant for a SQL Server (T-SQL) database.\n"
+    "You have READ-ONLY access.\n\n"
+    "CRITICAL SAFETY RULES:\n"
+    "- Output exactly ONE SQL SELECT query.\n"
+    "- Allowed clauses: SELECT, FROM, JOIN, WHERE, GROUP BY, ORDER BY, TOP.\n"
+    "- Never use INSERT/UPDATE/DELETE/DROP/ALTER/TRUNCATE/CREATE/MERGE.\n"
+    "- Always use explicit dbo.<table> names.\n"
+    "- ONLY use columns that exist in the provided schema. NEVER invent or assume column names.\n"
+    "- If a column does not exist in the schema, you CANNOT use it in your query.\n\n"
+    "PATIENT COUNT RULE:\n"
+    "- When counting or identifying patients, ALWAYS use dbo.patients as the primary table.\n"
+    "- Do NOT infer total patients from patient_notes, walkin_cases, or other auxiliary tables.\n\n"
+    "DATA EXTRACTION RULES:\n"
+    "- For diagnosis information: Search within the 'note' column of dbo.patient_notes using LIKE or string functions.\n"
+    "- For unstructured data: Use WHERE note LIKE '%keyword%' or string analysis functions.\n"
+    "- Do NOT assume structured columns exist if they are not in the schema.\n\n"
+    "ROLE-BASED ACCESS POLICY:\n"
+    "- Each request states the user's access policy. Always apply it.\n"
+    "- If the user asks something outside their permission, do NOT try to bypass it.\n"
+    "- Instead, write a query that returns an allowed aggregate or allowed subset.\n\n"
+)
+
+_SQL_SYSTEM_MESSAGE = SystemMessage(
+    content=_SQL_RULES + "Return ONLY the SQL query, with no explanation and no markdown."
+)
+
+_SQL_BATCH_SYSTEM_MESSAGE = SystemMessage(
+    content=_SQL_RULES + (
+        "You will get several numbered questions. Write one query per question, each "
+        "following every rule above, and "
+        "return ONLY a JSON array of objects {\"idx\": <question number>, \"sql\": \"<query>\"}, "
+        "with no explanation and no markdown."
+    )
+)
+
+
+_PHARMACY_GUIDANCE = (
+    "Extra guidance for pharmacy role:\n"
+    "- Prefer aggregated outputs (counts, totals, distributions) over listing patient rows.\n"
+    "- Avoid selecting any patient identity or contact information.\n\n"
+)
+
+
+def render_policy_context(role: str, scope_filter_hint: str) -> str:
+    """The per-user part of the generate_sql prompt (access policy + role guidance).
+
+    build_policy stores this on the Policy at login, so questions only
+    splice in a finished string.
+    """
+    context = f"Access policy:\n{scope_filter_hint}\n\n"
+    if role == "pharmacy":
+        context += _PHARMACY_GUIDANCE
+    return context
+
+
+def generate_sql(
+    llm: ChatOpenAI,
+    schema_text: str,
+    policy: Policy,
+    question: str,
+    cache: Optional[TTLCache] = None,
+) -> str:
+    """Ask the LLM to produce a safe, RBAC-compliant SQL SELECT query.
+
+    With *cache*, a repeat of a question under the same scope returns the
+    previously validated SQL without calling the LLM; only SQL that passed
+    every check below is stored.
+    """
+    if cache is not None:
+        key = sql_cache_key(schema_text, policy, question)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
 
     human = HumanMessage(
         content=(
             f"Schema:\n{schema_text}\n\n"
-            f"User question: {question}\n"
-            f"{role_hint}\n"
+            f"{policy.prompt_context or render_policy_context(policy.role, policy.scope_filter_hint)}"
+            f"User question: {question}\n\n"
             "Write the SQL query now."
         )
     )
 
-    resp = llm.invoke([system, human])
-    sql = resp.content.strip()
+    # Streamed so an answer that is already certain to be blocked (not a
+    # SELECT, or a write/DDL verb) stops generating there.
+    answer = ""
+    with closing(llm.stream([_SQL_SYSTEM_MESSAGE, human])) as chunks:
+        for chunk in chunks:
+            answer += chunk.content
+            if _doomed_answer(answer):
+                break
+    sql = _checked_sql(answer, policy)
 
-    # Strip markdown fences if present
-    if sql.lower().startswith("```sql"):
-        sql = sql.strip("`")
-        sql = re.sub(r"^sql", "", sql, flags=re.IGNORECASE).strip()
-    elif sql.startswith("```"):
-        sql = sql.strip("`").strip()
+    if cache is not None:
+        cache.set(key, sql)
+    return sql
 
-    # ── Safety checks ────────────────────────────────────────────────
-    if not re.match(r"(?is)^\s*select\b", sql):
-        raise ValueError(f"LLM generated non-SELECT query, blocked: {sql[:160]}...")
-    if re.search(r"\b(insert|update|delete|drop|alter|truncate|create|merge)\b", sql, re.IGNORECASE):
-        raise ValueError(f"LLM generated potentially unsafe query, blocked: {sql[:160]}...")
 
-    # ── RBAC enforcement ─────────────────────────────────────────────
-    tables = extract_dbo_tables(sql)
+def _doomed_answer(partial: str) -> bool:
+    """True once a partial LLM answer is sure to fail the non-SELECT / verb checks.
 
-    if "patients" in tables and policy.required_filter_column and policy.required_filter_value is not None:
-        if not contains_required_scope_filter(sql, policy.required_filter_column, policy.required_filter_value):
-            raise ValueError(
-                f"RBAC block: query references dbo.patients but missing required scope filter "
-                f"{policy.required_filter_column} = {policy.required_filter_value}."
-            )
+    Only complete words are judged (a trailing "update" may yet become
+    "update_at"), so this never contradicts the check on the full answer.
+    """
+    head = partial.lstrip()
+    if "```".startswith(head):
+        return False  # nothing yet, or an opening fence still arriving
+    if head.startswith("```"):
+        head = head.lstrip("`")
+        if head[:3].lower() == "sql":
+            head = head[3:]
+        head = head.lstrip()
+    head = head[:_PARTIAL_WORD_RE.search(head).start()]
+    if not head:
+        return False
+    return not _SELECT_RE.match(head) or _DANGER_RE.search(head) is not None
 
-    if policy.role == "pharmacy":
-        bad = blocks_pii_for_pharmacy(sql, policy.blocked_patient_columns)
-        if bad:
-            raise ValueError(f"RBAC block: pharmacy role query attempted to use PII column '{bad}'.")
-        if PHARMACY_AGGREGATES_ONLY:
-            pass  # optionally block patient_id selection here
 
+def _checked_sql(answer: str, policy: Policy) -> str:
+    """The LLM's *answer* as SQL, or ValueError if it fails a safety/RBAC check."""
+    sql = strip_code_fence(answer.strip())
+    error = _validation_error(
+        " ".join(sql.split()),
+        policy.role,
+        policy.required_filter_column,
+        policy.required_filter_value,
+        frozenset(policy.blocked_patient_columns) if policy.role == "pharmacy" else frozenset(),
+    )
+    if error:
+        raise ValueError(error)
     return sql
+
+
+def generate_sql_batch(
+    llm: ChatOpenAI,
+    schema_text: str,
+    policy: Policy,
+    questions: List[str],
+    cache: Optional[TTLCache] = None,
+) -> List[Union[str, ValueError]]:
+    """Like generate_sql for several questions, in a single LLM request.
+
+    The schema and policy are sent once for the whole batch instead of once
+    per question. Returns one entry per question, in order: the validated
+    SQL, or the ValueError explaining why that question's query was blocked
+    (or missing from the answer). Raises ValueError if the answer is not the
+    expected JSON array at all. With *cache*, questions already answered
+    under this scope are left out of the request, as in generate_sql.
+    """
+    results: List[Union[str, ValueError, None]] = [None] * len(questions)
+    keys = [sql_cache_key(schema_text, policy, q) for q in questions] if cache is not None else []
+    for i, key in enumerate(keys):
+        results[i] = cache.get(key)
+    pending = [i for i, r in enumerate(results) if r is None]
+    if not pending:
+        return results
+
+    numbered = "\n".join(f"{n}. {questions[i]}" for n, i in enumerate(pending))
+    human = HumanMessage(
+        content=(
+            f"Schema:\n{schema_text}\n\n"
+            f"{policy.prompt_context or render_policy_context(policy.role, policy.scope_filter_hint)}"
+            f"User questions:\n{numbered}\n\n"
+            "Write the SQL queries now."
+        )
+    )
+
+    resp = llm.invoke([_SQL_BATCH_SYSTEM_MESSAGE, human])
+    answer = resp.content.strip()
+    try:
+        # Tolerate a ```json fence or stray text around the array.
+        items = json.loads(answer[answer.index("["):answer.rindex("]") + 1])
+        by_idx = {int(item["idx"]): str(item["sql"]) for item in items}
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"LLM returned an unreadable batch answer: {answer[:160]}...") from e
+
+    for n, i in enumerate(pending):
+        if n not in by_idx:
+            results[i] = ValueError("LLM returned no SQL for this question.")
+            continue
+        try:
+            results[i] = _checked_sql(by_idx[n], policy)
+        except ValueError as e:
+            results[i] = e
+            continue
+        if cache is not None:
+            cache.set(keys[i], results[i])
+    return results
@@ -2,9 +2,13 @@
 Unit tests for basic and advanced analysis functions.
 """
 
+import numpy as np
 import pandas as pd
 
-from src.analysis import compute_basic_analysis, compute_advanced_analysis, summarize_result
+from src.analysis import (
+    compute_basic_analysis, compute_advanced_analysis, summarize_result, stream_summary,
+    quick_summary, wants_advanced_analysis,
+)
 
 
 # ── Helpers ──────────────────────────────────────────────────────────
@@ -21,6 +25,10 @@ class FakeLLM:
     def invoke(self, messages):
         return FakeLLMResponse(self._content)
 
+    def stream(self, messages):
+        for word in self._content.split(" "):
+            yield FakeLLMResponse(word + " ")
+
 
 # ── Tests: compute_basic_analysis ────────────────────────────────────
 
@@ -43,6 +51,13 @@ def test_compute_basic_analysis_numeric_and_categorical():
     assert "Column: big_cat" in c
 
 
+def test_numeric_summary_matches_describe():
+    from src.analysis import _numeric_describe
+    df = pd.DataFrame({"a": [1, 2, None, 4, 9], "b": [1.5, 2.5, 3.5, 0.0, -1.0]})
+    pd.testing.assert_frame_equal(_numeric_describe(df), df.describe().T, check_dtype=False)
+    assert "25%" not in _numeric_describe(df.head(3)).columns
+
+
 # ── Tests: compute_advanced_analysis ─────────────────────────────────
 
 def test_compute_advanced_analysis_no_rows():
@@ -79,3 +94,73 @@ def test_summarize_result_calls_llm_and_returns_text():
         advanced_summary="adv",
     )
     assert "summary" in out.lower()
+
+
+def test_stream_summary_yields_text_pieces():
+    llm = FakeLLM("three word summary")
+    pieces = list(stream_summary(
+        llm, "What is X?", "SELECT 1", pd.DataFrame({"a": [1, 2]}), "num", "cat", "adv",
+    ))
+    assert "".join(pieces).strip() == "three word summary"
+    assert len(pieces) == 3
+
+
+# ── Tests: quick_summary ─────────────────────────────────────────────
+
+def test_quick_summary_empty_and_scalar():
+    assert "no rows" in quick_summary(pd.DataFrame(columns=["n"])).lower()
+    assert quick_summary(pd.DataFrame({"n": [42]})) == "Result: n = 42."
+
+
+def test_quick_summary_small_results_answered_locally():
+    out = quick_summary(pd.DataFrame({"a": [1, 2], "b": [3, 4]}))
+    assert out.startswith("The query returned 2 rows and 2 columns")
+
+
+def test_quick_summary_none_for_real_tables():
+    assert quick_summary(pd.DataFrame({"a": range(20)})) is None
+    assert quick_summary(pd.DataFrame({"a": range(5), "b": range(5), "c": range(5), "d": range(5)})) is None
+
+
+def test_wants_advanced_analysis_by_row_count():
+    assert not wants_advanced_analysis(pd.DataFrame({"a": range(4)}))
+    assert wants_advanced_analysis(pd.DataFrame({"a": range(5)}))
+
+
+def test_correlation_matrix_matches_pandas_with_and_without_nans():
+    from src.analysis import _correlation_matrix
+    df = pd.DataFrame({"a": [1.0, 2, 3, 4, 5], "b": [2, 4, 7, 8, 9], "flat": [1, 1, 1, 1, 1]})
+    np.testing.assert_allclose(_correlation_matrix(df), df.corr().to_numpy())
+    df.loc[1, "a"] = None
+    np.testing.assert_allclose(_correlation_matrix(df), df.corr().to_numpy())
+
+
+def test_compute_advanced_analysis_skips_key_like_metric():
+    keys = pd.DataFrame({
+        "patient_no": range(100, 130),
+        "valid_visits": range(30),      # unique ints, but not named like a key
+        "score": [1.0, 2.0, 3.0] * 10,
+    })
+    out = compute_advanced_analysis(keys)
+    assert "Primary metric used for deeper analysis: valid_visits" in out
+    assert "identifier-like" in out and "tiers" not in out
+    assert "correlation" in out.lower()
+
+    out = compute_advanced_analysis(keys.drop(columns="valid_visits"))
+    assert "Primary metric used for deeper analysis: score" in out
+    assert "Quantile-based tiers" in out
+
+
+def test_compute_advanced_analysis_lists_five_strongest_correlations():
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=200)
+    df = pd.DataFrame({f"c{i}": base + rng.normal(scale=0.2 * i, size=200) for i in range(8)})
+    out = compute_advanced_analysis(df)
+    listed = [line for line in out.splitlines() if line.startswith("  - ") and " vs " in line]
+
+    c = df.corr().to_numpy()
+    iu, ju = np.triu_indices_from(c, k=1)
+    order = np.argsort(-np.abs(c[iu, ju]), kind="stable")[:5]
+    assert listed == [
+        f"  - c{iu[k]} vs c{ju[k]}: r = {c[iu[k], ju[k]]:.2f}" for k in order
+    ]
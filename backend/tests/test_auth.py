@@ -0,0 +1,15 @@
+"""
+Unit tests for session tokens and expiry in the API auth module.
+"""
+
+from datetime import timedelta
+
+import src.api.auth as auth
+
+
+def test_session_expires_from_creation_not_activity():
+    now = auth.utc_now()
+    old = now - timedelta(hours=auth.TOKEN_EXPIRY_HOURS, minutes=1)
+    assert auth.session_expired({"created_at": old, "last_activity": now}, now=now)
+    assert not auth.session_expired({"created_at": now, "last_activity": now}, now=now)
+    assert auth.generate_token() != auth.generate_token()
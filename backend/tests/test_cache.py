@@ -0,0 +1,30 @@
+"""
+Unit tests for the shared TTL/LRU cache.
+"""
+
+import src.cache as cache_mod
+from src.cache import TTLCache
+
+
+def test_lru_eviction_keeps_recently_used():
+    c = TTLCache(maxsize=2, ttl_seconds=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # touch "a" so "b" is the oldest
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert len(c) == 2
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_mod.time, "monotonic", lambda: now[0])
+    c = TTLCache(maxsize=10, ttl_seconds=5)
+    c.set("k", "v")
+    c.set("short", "v", ttl_seconds=1)
+    now[0] += 2
+    assert c.get("short") is None
+    assert c.get("k") == "v"
+    now[0] += 4
+    assert c.get("k", "gone") == "gone"
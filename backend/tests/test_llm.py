@@ -0,0 +1,81 @@
+"""
+Unit tests for the exact-match LLM response cache and prompt-cache telemetry.
+"""
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+import src.llm as llm_mod
+from src.cache import TTLCache
+from src.llm import CachedLLM, PromptCacheMonitor, prompt_token_usage
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = 0
+        self.model_name = "fake"
+
+    def invoke(self, messages):
+        self.calls += 1
+        return f"answer {self.calls}"
+
+    def stream(self, messages):
+        self.calls += 1
+        yield from ["ans", "wer"]
+
+
+def test_cached_llm_reuses_identical_prompts_only():
+    inner = FakeLLM()
+    llm = CachedLLM(inner, TTLCache(maxsize=8, ttl_seconds=60), model="m")
+    prompt = [SystemMessage(content="sys"), HumanMessage(content="q1")]
+
+    assert llm.invoke(prompt) == "answer 1"
+    assert llm.invoke(list(prompt)) == "answer 1"
+    assert llm.invoke([SystemMessage(content="sys"), HumanMessage(content="q2")]) == "answer 2"
+    # Same text under a different role is a different prompt.
+    assert llm.invoke([HumanMessage(content="sys"), HumanMessage(content="q1")]) == "answer 3"
+    assert inner.calls == 3
+    assert llm.model_name == "fake"
+
+
+def test_cached_llm_stream_caches_joined_chunks():
+    inner = FakeLLM()
+    llm = CachedLLM(inner, TTLCache(maxsize=8, ttl_seconds=60), model="m")
+    prompt = [HumanMessage(content="q")]
+
+    assert list(llm.stream(prompt)) == ["ans", "wer"]
+    assert list(llm.stream(prompt)) == ["answer"]
+    assert llm.invoke(prompt) == "answer"
+    assert inner.calls == 1
+
+
+def test_prompt_token_usage_reads_both_metadata_shapes():
+    standard = AIMessage(content="x", usage_metadata={
+        "input_tokens": 2000, "output_tokens": 5, "total_tokens": 2005,
+        "input_token_details": {"cache_read": 1536},
+    })
+    raw = AIMessage(content="x", response_metadata={"token_usage": {
+        "prompt_tokens": 1200, "prompt_tokens_details": {"cached_tokens": 0},
+    }})
+    assert prompt_token_usage(standard) == (2000, 1536)
+    assert prompt_token_usage(raw) == (1200, 0)
+    assert prompt_token_usage(AIMessage(content="x")) is None
+
+
+def test_prompt_cache_monitor_warns_once_when_ratio_collapses(monkeypatch):
+    alerts = []
+    monkeypatch.setattr(llm_mod.logger, "warning", lambda *a: alerts.append(a))
+    monitor = PromptCacheMonitor(alert_ratio=0.3, smoothing=1.0, warmup=2)
+    uncached = LLMResult(generations=[[ChatGeneration(message=AIMessage(
+        content="x", response_metadata={"token_usage": {"prompt_tokens": 2048}},
+    ))]])
+
+    monitor.record(500, 0)  # below the caching minimum: ignored
+    assert monitor.samples == 0
+    monitor.record(2048, 2048)
+    assert monitor.ratio == 1.0
+
+    monitor.on_llm_end(uncached)
+    monitor.on_llm_end(uncached)
+    assert monitor.ratio == 0.0 and monitor.samples == 3
+    assert len(alerts) == 1
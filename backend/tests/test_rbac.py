@@ -117,3 +117,24 @@ def test_build_policy_admin_ok():
     assert policy.role == "admin"
     assert policy.required_filter_column is None
     assert policy.required_filter_value is None
+    assert policy.prompt_context
+    other = AccessContext(user_id=10, display_name="Admin 2", role="admin",
+                          doctor_id=None, pharmacy_id=None)
+    assert build_policy(other) is policy  # user-independent, so shared
+
+
+def test_build_policy_unknown_role():
+    ctx = AccessContext(user_id=3, display_name="X", role="nurse",
+                        doctor_id=None, pharmacy_id=None)
+    with pytest.raises(ValueError, match="Unknown role: nurse"):
+        build_policy(ctx)
+
+
+def test_build_policy_renders_prompt_context_once():
+    ctx = AccessContext(user_id=2, display_name="Pharm", role="pharmacy",
+                        doctor_id=None, pharmacy_id=5)
+    policy = build_policy(ctx)
+    assert policy.prompt_context.startswith("Access policy:\n")
+    assert "pharmacy_id = 5" in policy.prompt_context
+    assert "Extra guidance for pharmacy role" in policy.prompt_context
+    assert policy.blocked_patient_columns is SENSITIVE_PATIENT_COLUMNS  # shared, not copied
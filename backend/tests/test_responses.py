@@ -0,0 +1,27 @@
+"""
+Unit tests for API response serialisation.
+"""
+
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from src.api.responses import dumps, frame_records, frame_rows
+
+
+def test_frame_records_serialises_like_to_dict():
+    df = pd.DataFrame({
+        "id": [1, 2, 3],
+        "score": [0.5, np.nan, 2.25],
+        "name": ["a", None, "c"],
+        "seen": pd.to_datetime(["2024-01-01 00:00", None, "2024-03-01 12:30"]),
+        "amount": [Decimal("1.10"), Decimal("2"), None],
+    })
+    records = frame_records(df)
+    assert records[0]["id"] == 1 and type(records[0]["id"]) is int
+    assert dumps(records) == dumps(df.to_dict(orient="records"))
+    assert frame_records(df.head(0)) == []
+
+    split = df.to_dict(orient="split")
+    assert dumps(frame_rows(df)) == dumps(split["data"])
@@ -0,0 +1,103 @@
+"""
+Unit tests for the session stores (Redis against an in-memory fake client).
+"""
+
+import pytest
+
+import src.cache as cache_mod
+from src.api.session_store import MemorySessionStore, RedisSessionStore
+from src.models import AccessContext
+
+
+# ── Helpers / Fakes ──────────────────────────────────────────────────
+
+class FakePipeline:
+    def __init__(self, client):
+        self._client = client
+        self._keys = []
+
+    def get(self, key):
+        self._keys.append(key)
+
+    def execute(self):
+        return [self._client.get(k) for k in self._keys]
+
+
+class FakeRedis:
+    """The handful of redis.Redis methods the store uses."""
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        self.ttls[key] = ttl
+
+    def delete(self, key):
+        return 1 if self.data.pop(key, None) is not None else 0
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        return [k.encode() for k in list(self.data) if k.startswith(prefix)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+def make_session():
+    ctx = AccessContext(user_id=1, display_name="Dr A", role="doctor",
+                        doctor_id=7, pharmacy_id=None)
+    return {"ctx": ctx, "policy": None}
+
+
+# ── Tests ────────────────────────────────────────────────────────────
+
+def test_roundtrip_with_ttl():
+    client = FakeRedis()
+    store = RedisSessionStore(client, ttl_seconds=60)
+    store["tok"] = make_session()
+
+    assert "tok" in store
+    assert store["tok"]["ctx"].doctor_id == 7
+    assert client.ttls["sess:tok"] == 60
+    assert store.get("missing") is None
+
+
+def test_delete_len_and_items():
+    store = RedisSessionStore(FakeRedis(), ttl_seconds=60)
+    store["a"] = make_session()
+    store["b"] = make_session()
+    assert len(store) == 2
+    assert sorted(tok for tok, _ in store.items()) == ["a", "b"]
+
+    del store["a"]
+    assert "a" not in store
+    assert store.pop("a", None) is None
+    with pytest.raises(KeyError):
+        del store["a"]
+    assert list(store) == ["b"]
+
+
+def test_memory_store_expires_idle_and_evicts_past_cap(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_mod.time, "monotonic", lambda: now[0])
+    store = MemorySessionStore(ttl_seconds=60, maxsize=2)
+    store["a"] = make_session()
+    now[0] += 50
+    store["b"] = make_session()
+    store["a"] = store["a"]  # a write restarts the TTL
+    now[0] += 50
+    assert sorted(store) == ["a", "b"] and len(store) == 2
+
+    store["c"] = make_session()  # over the cap: "b" is least recently used
+    assert "b" not in store and store.get("b") is None
+    now[0] += 61
+    assert "a" not in store and len(store) == 0
+    with pytest.raises(KeyError):
+        del store["a"]
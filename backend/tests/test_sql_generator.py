@@ -4,13 +4,19 @@ Unit tests for SQL generation and safety checks.
 
 import pytest
 
+from src.cache import TTLCache
 from src.config import SENSITIVE_PATIENT_COLUMNS
 from src.models import Policy
 from src.sql_generator import (
     extract_dbo_tables,
     contains_required_scope_filter,
     blocks_pii_for_pharmacy,
+    apply_row_limit,
+    has_row_limit,
+    scan_sql,
+    strip_code_fence,
     generate_sql,
+    generate_sql_batch,
 )
 
 
@@ -24,10 +30,22 @@ class FakeLLMResponse:
 class FakeLLM:
     def __init__(self, content: str):
         self._content = content
+        self.calls = 0
+        self.messages = []
 
     def invoke(self, messages):
+        self.calls += 1
+        self.messages.append(messages)
         return FakeLLMResponse(self._content)
 
+    def stream(self, messages, chunk_size=4):
+        self.calls += 1
+        self.messages.append(messages)
+        self.streamed = 0
+        for i in range(0, len(self._content), chunk_size):
+            self.streamed += 1
+            yield FakeLLMResponse(self._content[i:i + chunk_size])
+
 
 # ── Tests: helper functions ──────────────────────────────────────────
 
@@ -58,6 +76,53 @@ def test_blocks_pii_for_pharmacy_none_when_clean():
     assert bad is None
 
 
+def test_strip_code_fence_variants():
+    assert strip_code_fence("SELECT 1") == "SELECT 1"
+    assert strip_code_fence("```sql\nSELECT 1\n```") == "SELECT 1"
+    assert strip_code_fence("```SQL SELECT 1```") == "SELECT 1"
+    assert strip_code_fence("```\nSELECT 1\n```") == "SELECT 1"
+
+
+def test_scan_sql_matches_separate_checks():
+    sql = ("SELECT p.first_name, n.note FROM dbo.patients p "
+           "JOIN dbo.patient_notes n ON p.id = n.patient_id")
+    scan = scan_sql(sql, {"first_name", "email"})
+    assert scan.tables == extract_dbo_tables(sql) == {"patients", "patient_notes"}
+    assert scan.pii == blocks_pii_for_pharmacy(sql, {"first_name", "email"}) == "first_name"
+    assert scan.dangerous is None
+
+
+def test_scan_sql_still_checks_table_names():
+    scan = scan_sql("SELECT * FROM dbo.merge", {"merge"})
+    assert scan.tables == {"merge"}
+    assert scan.dangerous == "merge"
+    assert scan_sql("SELECT 1; DROP TABLE dbo.x").dangerous == "drop"
+
+
+def test_apply_row_limit_injects_top():
+    sql = "SELECT DISTINCT city FROM dbo.patients ORDER BY city"
+    assert apply_row_limit(sql, 101) == "SELECT DISTINCT TOP (101) city FROM dbo.patients ORDER BY city"
+
+
+def test_apply_row_limit_lowers_larger_top_only():
+    assert apply_row_limit("SELECT TOP 5000 * FROM dbo.bills", 101) == "SELECT TOP (101) * FROM dbo.bills"
+    assert apply_row_limit("SELECT TOP (5) * FROM dbo.bills", 101) == "SELECT TOP (5) * FROM dbo.bills"
+
+
+def test_apply_row_limit_leaves_ambiguous_queries():
+    for sql in (
+        "SELECT TOP 10 PERCENT * FROM dbo.bills",
+        "SELECT id FROM dbo.bills UNION SELECT id FROM dbo.patients",
+        "SELECT id FROM dbo.bills ORDER BY id OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY",
+    ):
+        assert apply_row_limit(sql, 101) == sql
+        assert has_row_limit(sql) is False
+
+
+def test_has_row_limit_after_rewrite():
+    assert has_row_limit(apply_row_limit("SELECT * FROM dbo.bills", 101)) is True
+
+
 # ── Tests: generate_sql ─────────────────────────────────────────────
 
 def test_generate_sql_strips_markdown_and_allows_select():
@@ -99,3 +164,105 @@ def test_generate_sql_pharmacy_blocks_pii():
     policy = Policy("pharmacy", "", "pharmacy_id", 2, set(SENSITIVE_PATIENT_COLUMNS), "")
     with pytest.raises(ValueError, match="(?i)pii"):
         generate_sql(llm, "(schema)", policy, "q")
+
+
+def test_generate_sql_stops_streaming_once_blocked():
+    policy = Policy("admin", "", None, None, set(), "")
+    llm = FakeLLM("DELETE FROM dbo.patients WHERE 1 = 1 -- " + "padding " * 50)
+    with pytest.raises(ValueError, match="non-SELECT"):
+        generate_sql(llm, "(schema)", policy, "q")
+    assert llm.streamed <= 3
+
+    llm = FakeLLM("SELECT id FROM dbo.visits; DROP TABLE dbo.visits -- " + "padding " * 50)
+    with pytest.raises(ValueError, match="unsafe"):
+        generate_sql(llm, "(schema)", policy, "q")
+    assert llm.streamed < 20
+
+    # A verb prefix inside a longer identifier is not cut short.
+    sql = "```sql\nSELECT last_update_at, created_by FROM dbo.visits\n```"
+    assert generate_sql(FakeLLM(sql), "(schema)", policy, "q") == (
+        "SELECT last_update_at, created_by FROM dbo.visits"
+    )
+
+
+def test_generate_sql_cache_reuses_sql_within_same_scope():
+    llm = FakeLLM("SELECT COUNT(*) FROM dbo.patients WHERE family_dr_id = 7")
+    policy = Policy("doctor", "", "family_dr_id", 7, set(), "")
+    cache = TTLCache(maxsize=8, ttl_seconds=60)
+    first = generate_sql(llm, "(schema)", policy, "How many patients?", cache=cache)
+    again = generate_sql(llm, "(schema)", policy, "  How many   patients? ", cache=cache)
+    assert again == first
+    assert llm.calls == 1
+
+    # Case can matter to quoted literals, so it is part of the key.
+    generate_sql(llm, "(schema)", policy, "How many patients named 'ABC'?", cache=cache)
+    generate_sql(llm, "(schema)", policy, "How many patients named 'abc'?", cache=cache)
+    assert llm.calls == 3
+
+    other_doctor = Policy("doctor", "", "family_dr_id", 8, set(), "")
+    with pytest.raises(ValueError, match="missing required scope filter"):
+        generate_sql(llm, "(schema)", other_doctor, "How many patients?", cache=cache)
+    assert llm.calls == 4
+
+
+def test_generate_sql_system_prompt_is_scope_independent():
+    llm = FakeLLM("SELECT COUNT(*) FROM dbo.patients WHERE family_dr_id = 7")
+    generate_sql(llm, "(schema)", Policy("doctor", "only dr 7", "family_dr_id", 7, set(), ""), "q")
+    generate_sql(llm, "(schema)", Policy("admin", "full access", None, None, set(), ""), "q")
+    (sys_a, human_a), (sys_b, human_b) = llm.messages
+    assert sys_a.content == sys_b.content
+    assert "only dr 7" in human_a.content and "full access" in human_b.content
+    # The schema leads the human message, so instructions + schema form one
+    # byte-identical prefix across users.
+    assert human_a.content.startswith("Schema:\n(schema)\n\nAccess policy:")
+    assert human_b.content.startswith("Schema:\n(schema)\n\nAccess policy:")
+
+
+def test_generate_sql_validation_is_memoised_per_scope():
+    from src.sql_generator import _validation_error
+    _validation_error.cache_clear()
+    llm = FakeLLM("SELECT COUNT(*)\n  FROM dbo.patients WHERE family_dr_id = 7")
+    policy = Policy("doctor", "", "family_dr_id", 7, set(), "")
+    generate_sql(llm, "(schema)", policy, "q")
+    generate_sql(llm, "(schema)", policy, "q again")
+    assert _validation_error.cache_info().hits == 1
+
+    other_doctor = Policy("doctor", "", "family_dr_id", 8, set(), "")
+    with pytest.raises(ValueError, match="missing required scope filter"):
+        generate_sql(llm, "(schema)", other_doctor, "q")
+
+
+# ── Tests: generate_sql_batch ───────────────────────────────────────
+
+def test_generate_sql_batch_validates_each_query():
+    llm = FakeLLM(
+        '```json\n[{"idx": 1, "sql": "SELECT * FROM dbo.patients"},'
+        ' {"idx": 0, "sql": "SELECT COUNT(*) FROM dbo.patients WHERE family_dr_id = 7"}]\n```'
+    )
+    policy = Policy("doctor", "only dr 7", "family_dr_id", 7, set(), "")
+    ok, blocked, missing = generate_sql_batch(llm, "(schema)", policy, ["count", "list", "other"])
+
+    assert ok == "SELECT COUNT(*) FROM dbo.patients WHERE family_dr_id = 7"
+    assert isinstance(blocked, ValueError) and "missing required scope filter" in str(blocked)
+    assert isinstance(missing, ValueError)
+    assert llm.calls == 1
+    human = llm.messages[0][1].content
+    assert human.count("(schema)") == 1 and "0. count\n1. list\n2. other" in human
+
+
+def test_generate_sql_batch_rejects_unparseable_answer():
+    llm = FakeLLM("SELECT 1")
+    with pytest.raises(ValueError, match="unreadable batch"):
+        generate_sql_batch(llm, "(schema)", Policy("admin", "", None, None, set(), ""), ["q"])
+
+
+def test_generate_sql_batch_skips_cached_questions():
+    policy = Policy("admin", "", None, None, set(), "")
+    cache = TTLCache(maxsize=8, ttl_seconds=60)
+    generate_sql(FakeLLM("SELECT 1"), "(schema)", policy, "Known question", cache=cache)
+
+    llm = FakeLLM('[{"idx": 0, "sql": "SELECT 2"}]')
+    assert generate_sql_batch(llm, "(schema)", policy, ["Known  question", "new"], cache=cache) \
+        == ["SELECT 1", "SELECT 2"]
+    assert "0. new" in llm.messages[0][1].content and "known" not in llm.messages[0][1].content.lower()
+    assert generate_sql(FakeLLM("SELECT 3"), "(schema)", policy, "new", cache=cache) == "SELECT 2"
@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+"""WSGI entry point for production servers, e.g. ``gunicorn -c gunicorn.conf.py wsgi:app``."""
+
+from src.api.app import create_app
+
+app = create_app()